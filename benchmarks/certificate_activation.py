@@ -0,0 +1,101 @@
+"""Measure certificate activation under concurrent requests.
+
+Run from the project folder:
+
+    python -m benchmarks.certificate_activation --workers 8 --requests 200
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from .common import setup_django
+
+
+def create_certificates(count: int) -> None:
+    from bot.models import Certificate, Customer, Impression, Order
+
+    impression = Impression.objects.create(
+        number=1,
+        name='Впечатление',
+        english_name='Impression',
+        price_in_rubles=1000,
+        price_in_euros=10
+    )
+    customer = Customer.objects.create(
+        chat_id=1,
+        tg_username='benchmark',
+        fullname='Benchmark'
+    )
+    orders = Order.objects.bulk_create(
+        Order(
+            impression=impression,
+            customer=customer,
+            recipient_fullname='Benchmark',
+            recipient_contact='Benchmark',
+            receiving_method=Order.EMAIL
+        )
+        for _ in range(count)
+    )
+    Certificate.objects.bulk_create(
+        Certificate(
+            certificate_id=certificate_id,
+            start_date=date.today() - timedelta(days=1),
+            expiry_date=date.today() + timedelta(days=1),
+            impression=impression,
+            order=order
+        )
+        for certificate_id, order in enumerate(orders, start=1)
+    )
+
+
+def activate(certificate_id: int) -> bool:
+    from asgiref.sync import async_to_sync
+    from django.db import connection
+
+    from bot.database import Database
+
+    try:
+        activation = async_to_sync(Database.activate_certificate)(
+            chat_id=certificate_id,
+            tg_username='benchmark',
+            language='russian',
+            certificate_id=certificate_id
+        )
+    finally:
+        connection.close()
+    return activation['availability']
+
+
+def run(certificate_ids, workers: int):
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        activations = list(executor.map(activate, certificate_ids))
+    return sum(activations), time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    options = parser.parse_args()
+
+    setup_django()
+    create_certificates(options.requests + 1)
+
+    scenarios = [
+        ('same certificate', [options.requests + 1] * options.requests),
+        ('different certificates', range(1, options.requests + 1)),
+    ]
+    for scenario, certificate_ids in scenarios:
+        activated_count, elapsed = run(certificate_ids, options.workers)
+        print(
+            f'{scenario}: {options.requests} requests, '
+            f'{activated_count} activated, '
+            f'{elapsed:.3f} s, '
+            f'{options.requests / elapsed:.0f} requests/s'
+        )
+
+
+if __name__ == '__main__':
+    main()
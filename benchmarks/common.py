@@ -0,0 +1,46 @@
+"""Set up Django with a throwaway database for benchmarks."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(
+    database_timeout: Optional[float] = 20,
+    database_path: Optional[Path] = None
+) -> Path:
+    """Configure Django to use a new SQLite database and create its tables.
+
+    If ``database_path`` is given, that database is used as it is. If
+    ``database_timeout`` is ``None``, the timeout of the settings is kept.
+    The secret key and the bot token are not needed by benchmarks, so
+    placeholders are used when they are not set.
+
+    Returns:
+        :obj:`Path`: The path to the database file.
+    """
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'impressions.settings')
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark')
+
+    import django
+    from django.conf import settings
+
+    create_tables = database_path is None
+    if create_tables:
+        database_path = Path(tempfile.mkdtemp()) / 'benchmark.sqlite3'
+    settings.DATABASES['default']['NAME'] = str(database_path)
+    if database_timeout is not None:
+        settings.DATABASES['default'].setdefault('OPTIONS', {})
+        settings.DATABASES['default']['OPTIONS']['timeout'] = database_timeout
+    settings.MIGRATION_MODULES = {'bot': None}
+    django.setup()
+
+    if create_tables:
+        from django.core.management import call_command
+        call_command('migrate', run_syncdb=True, verbosity=0)
+    return database_path
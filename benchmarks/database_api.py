@@ -0,0 +1,62 @@
+"""Compare the per-call time of Database and AsyncDatabase menu reads.
+
+Run from the project folder:
+
+    python -m benchmarks.database_api --calls 10000
+"""
+import argparse
+import asyncio
+import time
+
+from .common import setup_django
+
+
+def create_catalog() -> None:
+    from bot.models import Impression
+
+    Impression.objects.bulk_create(
+        Impression(
+            number=number,
+            name=f'Впечатление {number}',
+            english_name=f'Impression {number}',
+            price_in_rubles=1000,
+            price_in_euros=10
+        )
+        for number in range(1, 21)
+    )
+
+
+async def measure(database, calls: int) -> float:
+    await database.get_impressions('russian')
+    started_at = time.perf_counter()
+    for _ in range(calls):
+        await database.get_impressions('russian')
+        await database.get_policy_url('russian')
+        await database.activate_certificate(
+            chat_id=1,
+            tg_username='benchmark',
+            language='russian',
+            certificate_id='not a code'
+        )
+    return (time.perf_counter() - started_at) / calls / 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=10000)
+    options = parser.parse_args()
+
+    setup_django()
+    create_catalog()
+
+    from bot.database import AsyncDatabase, Database
+    for database in (Database(), AsyncDatabase()):
+        per_call = asyncio.run(measure(database, options.calls))
+        print(
+            f'{type(database).__name__}: '
+            f'{per_call * 1_000_000:.1f} µs per call'
+        )
+
+
+if __name__ == '__main__':
+    main()
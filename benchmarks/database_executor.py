@@ -0,0 +1,146 @@
+"""Measure concurrent chats loading their data while orders are created.
+
+Meanwhile another process, like the admin or the archive job, holds the
+write lock of the database from time to time, so creating an order may
+wait for it.
+
+Run once with the single ``sync_to_async`` thread and once with a pool of
+database threads to compare them:
+
+    DATABASE_THREADS=0 python -m benchmarks.database_executor
+    DATABASE_THREADS=8 python -m benchmarks.database_executor
+"""
+import argparse
+import asyncio
+import io
+import sqlite3
+import statistics
+import threading
+import time
+
+from .common import setup_django
+
+
+def create_chats(count: int) -> None:
+    from bot.models import ChatData, Impression
+
+    Impression.objects.create(
+        number=1,
+        name='Впечатление',
+        english_name='Impression',
+        price_in_rubles=1000,
+        price_in_euros=10
+    )
+    ChatData.objects.bulk_create(
+        ChatData(chat_id=chat_id, next_state=3, language='russian')
+        for chat_id in range(1, count + 1)
+    )
+
+
+async def load_chats(chat_ids, latencies) -> None:
+    from bot.persistence import DjangoPersistence
+
+    for chat_id in chat_ids:
+        started_at = time.perf_counter()
+        await DjangoPersistence._load_chat_data(chat_id)
+        latencies.append(time.perf_counter() - started_at)
+
+
+async def create_orders(count: int, screenshot_size: int) -> None:
+    from bot.database import Database
+
+    for chat_id in range(1, count + 1):
+        await Database.create_order(
+            chat_id=chat_id,
+            tg_username='benchmark',
+            language='russian',
+            customer_email='benchmark@example.com',
+            customer_fullname='Benchmark',
+            customer_phone='',
+            impression_id=1,
+            recipient_fullname='Benchmark',
+            recipient_contact='Benchmark',
+            email_receiving=True,
+            screenshot_stream=io.BytesIO(bytes(screenshot_size))
+        )
+
+
+def hold_write_lock(database_path, hold: float, pause: float, stop) -> None:
+    """Take the write lock for ``hold`` seconds every ``pause`` seconds."""
+    connection = sqlite3.connect(database_path, isolation_level=None)
+    while not stop.wait(pause):
+        connection.execute('BEGIN IMMEDIATE')
+        time.sleep(hold)
+        connection.execute('COMMIT')
+    connection.close()
+
+
+async def run(options, database_path) -> None:
+    latencies = []
+    stop = threading.Event()
+    lock_holder = threading.Thread(
+        target=hold_write_lock,
+        args=(
+            database_path,
+            options.lock_hold / 1000,
+            options.lock_pause / 1000,
+            stop
+        )
+    )
+    lock_holder.start()
+    started_at = time.perf_counter()
+    await asyncio.gather(
+        create_orders(options.orders, options.screenshot_size),
+        *(
+            load_chats(
+                range(chat, options.chats * options.loads + 1, options.chats),
+                latencies
+            )
+            for chat in range(1, options.chats + 1)
+        )
+    )
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    lock_holder.join()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f'{len(latencies)} loads by {options.chats} chats '
+        f'and {options.orders} orders: {elapsed:.3f} s, '
+        f'{len(latencies) / elapsed:.0f} loads/s, '
+        f'p50 {quantiles[49] * 1000:.1f} ms, '
+        f'p95 {quantiles[94] * 1000:.1f} ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--loads', type=int, default=20)
+    parser.add_argument('--orders', type=int, default=20)
+    parser.add_argument('--screenshot-size', type=int, default=100_000)
+    parser.add_argument(
+        '--lock-hold',
+        type=float,
+        default=20,
+        help='Milliseconds another process holds the write lock'
+    )
+    parser.add_argument(
+        '--lock-pause',
+        type=float,
+        default=50,
+        help='Milliseconds between the write locks of another process'
+    )
+    options = parser.parse_args()
+
+    database_path = setup_django()
+    from django.conf import settings
+    settings.MEDIA_ROOT = f'{database_path}.media'
+    create_chats(options.chats * options.loads)
+
+    print(f'DATABASE_THREADS={settings.DATABASE_THREADS}')
+    asyncio.run(run(options, database_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compare making the main menu keyboard on every update with taking it
+from the keyboard registry.
+
+Every round makes the keyboard and serializes it for the Bot API, as the
+bot does for every menu it sends. Run from the project folder:
+
+    python -m benchmarks.keyboards --rounds 20000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from .common import setup_django
+
+
+def measure(make_reply_markup, rounds: int):
+    """Return the time per round and the memory allocated to get the
+    keyboard and its payload.
+    """
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        json.dumps(make_reply_markup().to_dict())
+    elapsed = time.perf_counter() - started_at
+
+    tracemalloc.start()
+    make_reply_markup().to_dict()
+    tracemalloc.reset_peak()
+    size_before, _ = tracemalloc.get_traced_memory()
+    make_reply_markup().to_dict()
+    _, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / rounds, peak_size - size_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20000)
+    options = parser.parse_args()
+
+    setup_django()
+
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    import run_bot
+
+    messages = run_bot.default_messages
+
+    def make_main_menu():
+        return InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton(
+                    messages['impressions_button'],
+                    callback_data='impression'
+                ),
+                InlineKeyboardButton(
+                    messages['certificate_button'],
+                    callback_data='certificate'
+                )
+            ],
+            [
+                InlineKeyboardButton(
+                    messages['faq_button'],
+                    callback_data='faq'
+                )
+            ]
+        ])
+
+    def get_main_menu():
+        return run_bot.keyboards.get('main_menu', messages)
+
+    for name, make_reply_markup in (
+        ('made on every update', make_main_menu),
+        ('from the registry', get_main_menu)
+    ):
+        per_round, allocated_size = measure(
+            make_reply_markup,
+            options.rounds
+        )
+        print(
+            f'{name}: {per_round * 1_000_000:.1f} µs, '
+            f'{allocated_size} bytes allocated per round'
+        )
+
+
+if __name__ == '__main__':
+    main()
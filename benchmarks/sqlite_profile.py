@@ -0,0 +1,84 @@
+"""Measure concurrent writes of the bot and the admin processes.
+
+The bot process creates support applications, the admin process reads the
+list of applications and marks them accepted. Run it with both profiles:
+
+    DATABASE_PROFILE=default python -m benchmarks.sqlite_profile
+    DATABASE_PROFILE=production python -m benchmarks.sqlite_profile
+"""
+import argparse
+import multiprocessing
+import time
+from pathlib import Path
+
+from .common import setup_django
+
+
+def bot_writes(database_path: Path, duration: float) -> int:
+    """Create support applications for ``duration`` seconds."""
+    setup_django(database_timeout=None, database_path=database_path)
+    from bot.models import SupportApplication
+
+    writes_count = 0
+    finish_at = time.monotonic() + duration
+    while time.monotonic() < finish_at:
+        SupportApplication.objects.create(
+            chat_id=writes_count,
+            tg_username='benchmark',
+            request_type=SupportApplication.QUESTION_FOR_OPERATOR
+        )
+        writes_count += 1
+    return writes_count
+
+
+def admin_writes(database_path: Path, duration: float) -> int:
+    """Read the latest applications and accept one for ``duration`` seconds."""
+    setup_django(database_timeout=None, database_path=database_path)
+    from bot.models import SupportApplication
+
+    writes_count = 0
+    finish_at = time.monotonic() + duration
+    while time.monotonic() < finish_at:
+        applications = list(
+            SupportApplication.objects.filter(accepted=False)[:100]
+        )
+        if applications:
+            SupportApplication.objects.filter(
+                pk=applications[-1].pk
+            ).update(accepted=True)
+            writes_count += 1
+    return writes_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=5)
+    options = parser.parse_args()
+
+    database_path = setup_django(database_timeout=None)
+    from django.conf import settings
+    from django.db import connection
+    connection.close()
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(2) as pool:
+        bot = pool.apply_async(
+            bot_writes,
+            (database_path, options.duration)
+        )
+        admin = pool.apply_async(
+            admin_writes,
+            (database_path, options.duration)
+        )
+        bot_writes_count = bot.get()
+        admin_writes_count = admin.get()
+
+    print(
+        f'DATABASE_PROFILE={settings.DATABASE_PROFILE}: '
+        f'bot {bot_writes_count / options.duration:.0f} writes/s, '
+        f'admin {admin_writes_count / options.duration:.0f} writes/s'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Measure how many updates per second are handled with different limits
+of concurrently handled chats.
+
+Every update waits like a handler downloading a payment screenshot.
+Run from the project folder:
+
+    python -m benchmarks.update_processing --chats 100 --updates 5
+"""
+import argparse
+import asyncio
+import time
+
+from telegram import Update
+
+from bot.updates import ChatUpdateProcessor
+
+
+def make_updates(chats: int, updates_per_chat: int):
+    return [
+        Update.de_json(
+            {
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id,
+                    'date': 0,
+                    'chat': {'id': update_id % chats, 'type': 'private'},
+                    'text': 'text'
+                }
+            },
+            None
+        )
+        for update_id in range(chats * updates_per_chat)
+    ]
+
+
+async def measure(processor, updates, handling_time: float) -> float:
+    async def handle():
+        await asyncio.sleep(handling_time)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(
+        processor.process_update(update, handle())
+        for update in updates
+    ))
+    return len(updates) / (time.perf_counter() - started_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--updates', type=int, default=5)
+    parser.add_argument('--handling-time', type=float, default=0.02)
+    parser.add_argument(
+        '--limits',
+        type=int,
+        nargs='+',
+        default=[1, 4, 16, 64]
+    )
+    options = parser.parse_args()
+
+    updates = make_updates(options.chats, options.updates)
+    for limit in options.limits:
+        processor = ChatUpdateProcessor(limit, len(updates))
+        updates_per_second = asyncio.run(
+            measure(processor, updates, options.handling_time)
+        )
+        print(f'{limit} chats at a time: {updates_per_second:.0f} updates/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
 from django.utils.html import format_html
 
 from bot.models import (
+    ArchivedChatData,
     BotData,
     Certificate,
     ChatData,
@@ -13,6 +16,17 @@ from bot.models import (
 )
 
 
+class LatestInlineFormSet(BaseInlineFormSet):
+    """Show only the latest ``limit`` related objects in an inline."""
+    limit = 20
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not queryset.query.is_sliced:
+            queryset = self._queryset = queryset[:self.limit]
+        return queryset
+
+
 @admin.register(BotData)
 class BotDataAdmin(admin.ModelAdmin):
     list_display = ('id', 'bot_name',)
@@ -21,12 +35,18 @@ class BotDataAdmin(admin.ModelAdmin):
 
 @admin.register(ChatData)
 class ChatDataAdmin(admin.ModelAdmin):
-    list_display = ('chat_id', 'called_at', 'data',)
+    list_display = (
+        'chat_id', 'called_at', 'next_state', 'language', 'data',
+    )
+    list_filter = ('language',)
     search_fields = ('chat_id',)
+    show_full_result_count = False
     readonly_fields = (
         'chat_id',
         'start_at',
         'called_at',
+        'next_state',
+        'language',
         'data'
     )
 
@@ -40,6 +60,24 @@ class ChatDataAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(ArchivedChatData)
+class ArchivedChatDataAdmin(admin.ModelAdmin):
+    list_display = ('chat_id', 'called_at', 'archived_at',)
+    search_fields = ('chat_id',)
+    show_full_result_count = False
+    fields = ('chat_id', 'start_at', 'called_at', 'archived_at')
+    readonly_fields = ('chat_id', 'start_at', 'called_at', 'archived_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Impression)
 class ImpressionAdmin(admin.ModelAdmin):
     list_display = ('number', 'name', 'price_in_rubles', 'availability')
@@ -54,6 +92,7 @@ class ImpressionAdmin(admin.ModelAdmin):
 class CertificateInline(admin.TabularInline):
     model = Certificate
     extra = 1
+    autocomplete_fields = ('impression',)
 
 
 @admin.register(Order)
@@ -72,6 +111,7 @@ class OrderAdmin(admin.ModelAdmin):
     )
     raw_id_fields = ('customer', 'impression')
     inlines = (CertificateInline,)
+    show_full_result_count = False
 
     def get_image_preview(self, obj):
         if not obj.id or not obj.payment_screenshot:
@@ -85,6 +125,16 @@ class OrderAdmin(admin.ModelAdmin):
 class OrderInline(admin.TabularInline):
     model = Order
     extra = 0
+    formset = LatestInlineFormSet
+    fields = (
+        'created_at', 'number', 'impression', 'receiving_method', 'confirmed',
+        'given_for_delivery', 'delivered'
+    )
+    readonly_fields = ('created_at', 'impression')
+    show_change_link = True
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('impression')
 
 
 @admin.register(Customer)
@@ -92,8 +142,21 @@ class CustomerAdmin(admin.ModelAdmin):
     list_display = ('chat_id', 'tg_username', 'phone', 'fullname')
     list_display_links = ('chat_id', 'tg_username')
     search_fields = ('chat_id', 'tg_nick', 'phone', 'fullname')
-    readonly_fields = ('chat_id', 'registered_at')
+    readonly_fields = ('chat_id', 'registered_at', 'get_orders_link')
     inlines = (OrderInline,)
+    show_full_result_count = False
+
+    @admin.display(description='Заказы')
+    def get_orders_link(self, obj):
+        if not obj.chat_id:
+            return ''
+        return format_html(
+            '<a href="{url}?customer__chat_id__exact={chat_id}">'
+            'Все заказы: {count}</a>',
+            url=reverse('admin:bot_order_changelist'),
+            chat_id=obj.chat_id,
+            count=obj.orders.count()
+        )
 
 
 @admin.register(SupportApplication)
@@ -106,6 +169,7 @@ class SupportApplicationAdmin(admin.ModelAdmin):
     list_filter = ('request_type', 'tg_username', 'accepted', 'closed')
     search_fields = ('request_type', 'tg_nick')
     raw_id_fields = ('order', 'certificate')
+    show_full_result_count = False
 
 
 @admin.register(Faq)
@@ -127,3 +191,4 @@ class CertificateAdmin(admin.ModelAdmin):
     list_display_links = ('certificate_id', 'start_date', 'expiry_date')
     search_fields = ('certificate_id', 'activated_at', 'blocked', 'used')
     raw_id_fields = ('impression', 'order')
+    show_full_result_count = False
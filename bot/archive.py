@@ -0,0 +1,138 @@
+import json
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedChatData, ChatData
+
+
+def get_archive_cutoff(idle_days: Optional[int] = None) -> datetime:
+    """Return the time of last activity before which chats are archived."""
+    if idle_days is None:
+        idle_days = settings.CHAT_ARCHIVE_IDLE_DAYS
+    return timezone.now() - timedelta(days=idle_days)
+
+
+def archive_stale_chats(
+    idle_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    pause: float = 0
+) -> int:
+    """Move the chats idle for longer than ``idle_days`` to the archive.
+
+    Chats are moved in batches of ``batch_size``, each batch in its own
+    short transaction, so the bot is never locked out of ChatData for
+    long.
+
+    Returns:
+        :obj:`int`: How many chats have been archived.
+    """
+    if batch_size is None:
+        batch_size = settings.CHAT_ARCHIVE_BATCH_SIZE
+
+    cutoff = get_archive_cutoff(idle_days)
+    archived_count = 0
+    while True:
+        batch_count = archive_chat_batch(cutoff, batch_size)
+        archived_count += batch_count
+        if batch_count < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return archived_count
+
+
+def archive_chat_batch(cutoff: datetime, batch_size: int) -> int:
+    """Move up to ``batch_size`` chats idle since before ``cutoff`` to the
+    archive in one transaction.
+
+    The rows are locked where the database supports it, and only the
+    chats which are deleted from ChatData are written to the archive, so
+    a chat which became active after it was selected stays out of it.
+
+    Returns:
+        :obj:`int`: How many chats have been archived.
+    """
+    with transaction.atomic():
+        chats = list(
+            ChatData.objects.select_for_update()
+            .filter(called_at__lt=cutoff)
+            .order_by('called_at')[:batch_size]
+        )
+        if not chats:
+            return 0
+
+        chat_ids = [chat.chat_id for chat in chats]
+        ChatData.objects.filter(
+            chat_id__in=chat_ids,
+            called_at__lt=cutoff
+        ).delete()
+        active_chat_ids = set(
+            ChatData.objects.filter(chat_id__in=chat_ids)
+            .values_list('chat_id', flat=True)
+        )
+        archived_chats = [
+            chat for chat in chats if chat.chat_id not in active_chat_ids
+        ]
+        ArchivedChatData.objects.bulk_create(
+            [
+                ArchivedChatData(
+                    chat_id=chat.chat_id,
+                    start_at=chat.start_at,
+                    called_at=chat.called_at,
+                    payload=compress_chat_data({
+                        'next_state': chat.next_state,
+                        'language': chat.language,
+                        'data': chat.data
+                    })
+                )
+                for chat in archived_chats
+            ],
+            update_conflicts=True,
+            unique_fields=['chat_id'],
+            update_fields=[
+                'start_at',
+                'called_at',
+                'archived_at',
+                'payload'
+            ]
+        )
+    return len(archived_chats)
+
+
+def restore_archived_chat(chat_id: int) -> Optional[Dict[str, Any]]:
+    """Move the chat from the archive back to ChatData.
+
+    Returns:
+        :obj:`dict`: The ``next_state``, ``language`` and ``data`` of the
+        chat, or :obj:`None` if the chat is not in the archive.
+    """
+    with transaction.atomic():
+        archived_chat = ArchivedChatData.objects.filter(
+            chat_id=chat_id
+        ).first()
+        if not archived_chat:
+            return None
+
+        row = decompress_chat_data(archived_chat.payload)
+        ChatData.objects.create(chat_id=chat_id, **row)
+        ChatData.objects.filter(chat_id=chat_id).update(
+            start_at=archived_chat.start_at
+        )
+        archived_chat.delete()
+    return row
+
+
+def compress_chat_data(row: Dict[str, Any]) -> bytes:
+    return zlib.compress(
+        json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode()
+    )
+
+
+def decompress_chat_data(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload))
@@ -0,0 +1,134 @@
+import random
+from datetime import date
+from typing import Callable, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import QuerySet
+
+from .models import Certificate, Impression
+from .signals import drop_certificate_filter
+
+CERTIFICATE_ID_MIN = 10_000_000
+CERTIFICATE_ID_MAX = 99_999_999
+
+
+class CertificateIdGenerator():
+    """Generate random 8-digit certificate ids which are not taken yet.
+
+    The ids are hard to guess, since they are drawn from the system
+    source of randomness, and never repeat the ids in ``taken_ids`` or
+    the ids generated before.
+    """
+    def __init__(self, taken_ids: Iterable[int]):
+        self.taken_ids: Set[int] = set(taken_ids)
+        self._random = random.SystemRandom()
+
+    def __next__(self) -> int:
+        if len(self.taken_ids) > CERTIFICATE_ID_MAX - CERTIFICATE_ID_MIN:
+            raise ValueError('All certificate ids are taken')
+
+        while True:
+            certificate_id = self._random.randint(
+                CERTIFICATE_ID_MIN,
+                CERTIFICATE_ID_MAX
+            )
+            if certificate_id not in self.taken_ids:
+                self.taken_ids.add(certificate_id)
+                return certificate_id
+
+    def __iter__(self):
+        return self
+
+
+def _lock_certificates() -> None:
+    """Take the write lock of the database in the current transaction.
+
+    SQLite begins transactions as readers, so two issues could read the
+    same taken ids and orders before either of them writes. A write
+    statement which changes nothing makes the other issue wait until
+    this transaction ends.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    table = connection.ops.quote_name(Certificate._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE 0')
+
+
+def _create_certificates(
+    get_certificates: Callable[[], List[Certificate]],
+    batch_size: Optional[int]
+) -> List[Certificate]:
+    """Give the certificates ids and insert them in one transaction.
+
+    The certificates are got from ``get_certificates`` after the write
+    lock is taken, so that they and the taken ids are read in the same
+    transaction.
+    """
+    if batch_size is None:
+        batch_size = settings.CERTIFICATE_ISSUE_BATCH_SIZE
+
+    with transaction.atomic():
+        _lock_certificates()
+        certificates = get_certificates()
+        certificate_ids = CertificateIdGenerator(
+            Certificate.objects.values_list('certificate_id', flat=True)
+        )
+        for certificate in certificates:
+            certificate.certificate_id = next(certificate_ids)
+        Certificate.objects.bulk_create(certificates, batch_size=batch_size)
+
+    if certificates:
+        transaction.on_commit(drop_certificate_filter)
+    return certificates
+
+
+def issue_certificates_for_orders(
+    orders: QuerySet,
+    start_date: date,
+    expiry_date: date,
+    batch_size: Optional[int] = None
+) -> List[Certificate]:
+    """Issue a certificate for every order of ``orders`` which has none yet.
+
+    Returns:
+        :obj:`list`: The issued certificates.
+    """
+    def get_certificates():
+        return [
+            Certificate(
+                start_date=start_date,
+                expiry_date=expiry_date,
+                impression_id=order.impression_id,
+                order=order
+            )
+            for order in orders.filter(certificate__isnull=True)
+        ]
+
+    return _create_certificates(get_certificates, batch_size)
+
+
+def issue_certificates(
+    impression: Impression,
+    count: int,
+    start_date: date,
+    expiry_date: date,
+    batch_size: Optional[int] = None
+) -> List[Certificate]:
+    """Issue ``count`` certificates for the impression without orders.
+
+    Returns:
+        :obj:`list`: The issued certificates.
+    """
+    def get_certificates():
+        return [
+            Certificate(
+                start_date=start_date,
+                expiry_date=expiry_date,
+                impression=impression
+            )
+            for _ in range(count)
+        ]
+
+    return _create_certificates(get_certificates, batch_size)
@@ -0,0 +1,137 @@
+import logging
+import time
+from enum import IntEnum
+from types import MappingProxyType
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type
+)
+
+logger = logging.getLogger(__name__)
+
+StateHandler = Callable[..., Awaitable[Optional[int]]]
+
+
+class StateMachine():
+    """Dispatch the updates of a chat to the handler of its state.
+
+    The transition table maps every state to its handler and to the
+    states the handler can move the chat to. The table is checked when the
+    machine is built: every state must have a handler, lead only to known
+    states and be reachable from the initial state. A handler returning
+    no state starts the conversation over.
+
+    Dispatch is a lookup in a list indexed by the state. The machine
+    counts the entries of every state and the time spent in its handler.
+    """
+    def __init__(
+        self,
+        states: Type[IntEnum],
+        initial_state: IntEnum,
+        transitions: Mapping[IntEnum, Tuple[StateHandler, Collection[int]]]
+    ):
+        self.states = states
+        self.initial_state = initial_state
+        self.transitions = MappingProxyType({
+            states(state): (handler, frozenset(map(states, next_states)))
+            for state, (handler, next_states) in transitions.items()
+        })
+        self._validate()
+
+        size = max(states) + 1
+        self._handlers: List[Optional[StateHandler]] = [None] * size
+        self._next_states: List[frozenset] = [frozenset()] * size
+        for state, (handler, next_states) in self.transitions.items():
+            self._handlers[state] = handler
+            self._next_states[state] = next_states
+        self._entries = [0] * size
+        self._handling_time = [0.0] * size
+        self._max_handling_time = [0.0] * size
+        self.unexpected_transitions = 0
+
+    def _validate(self) -> None:
+        """Raise ValueError if the transition table is incomplete."""
+        missing_states = [
+            state.name
+            for state in self.states
+            if state not in self.transitions
+        ]
+        if missing_states:
+            raise ValueError(
+                f'No handlers for states: {", ".join(missing_states)}'
+            )
+
+        for state, (handler, _) in self.transitions.items():
+            if not callable(handler):
+                raise ValueError(f'Handler of {state.name} is not callable')
+
+        reachable_states = set()
+        states_to_visit = [self.initial_state]
+        while states_to_visit:
+            state = states_to_visit.pop()
+            if state in reachable_states:
+                continue
+            reachable_states.add(state)
+            states_to_visit.extend(self.transitions[state][1])
+
+        unreachable_states = [
+            state.name
+            for state in self.states
+            if state not in reachable_states
+        ]
+        if unreachable_states:
+            raise ValueError(
+                f'Unreachable states: {", ".join(unreachable_states)}'
+            )
+
+    async def handle(self, state: int, *args: Any) -> int:
+        """Call the handler of the state and return the next state."""
+        handler = self._handlers[state]
+        started_at = time.perf_counter()
+        try:
+            next_state = await handler(*args)
+        finally:
+            handling_time = time.perf_counter() - started_at
+            self._entries[state] += 1
+            self._handling_time[state] += handling_time
+            if handling_time > self._max_handling_time[state]:
+                self._max_handling_time[state] = handling_time
+
+        if next_state and next_state not in self._next_states[state]:
+            self.unexpected_transitions += 1
+            logger.warning(
+                'Unexpected transition from %s to %s',
+                self.states(state).name,
+                next_state
+            )
+        return next_state or self.initial_state
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return the entries and handling time of every entered state."""
+        return {
+            state.name: {
+                'entries': self._entries[state],
+                'mean_time': self._handling_time[state] / self._entries[state],
+                'max_time': self._max_handling_time[state],
+            }
+            for state in self.states
+            if self._entries[state]
+        }
+
+    def log_stats(self) -> None:
+        for name, state_stats in self.stats().items():
+            logger.info(
+                '%s: %d entries, %.1f ms mean, %.1f ms max',
+                name,
+                state_stats['entries'],
+                state_stats['mean_time'] * 1000,
+                state_stats['max_time'] * 1000
+            )
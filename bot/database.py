@@ -1,11 +1,24 @@
 import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from array import array
 from asgiref.sync import sync_to_async
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional
 from pytz import timezone
 
 from django.conf import settings
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files import File
+from django.db import transaction
 
 from .models import (
     BotData,
@@ -16,11 +29,464 @@ from .models import (
     Order,
     SupportApplication
 )
+from .outbox import support_application_outbox
+
+logger = logging.getLogger(__name__)
+
+database_executor: Optional[ThreadPoolExecutor] = (
+    ThreadPoolExecutor(
+        max_workers=settings.DATABASE_THREADS,
+        thread_name_prefix='database'
+    )
+    if settings.DATABASE_THREADS
+    else None
+)
+
+
+def database_sync_to_async(func: Callable) -> Callable:
+    """Make the function awaitable like ``sync_to_async`` does.
+
+    If ``DATABASE_THREADS`` is set, the function runs in a pool of that
+    many threads, each with its own database connection, instead of the
+    single thread shared by all ``sync_to_async`` calls. Use it only for
+    functions which read or write in their own transaction and do not
+    depend on the calls made before.
+    """
+    if database_executor is None:
+        return sync_to_async(func)
+
+    return sync_to_async(
+        func,
+        thread_sensitive=False,
+        executor=database_executor
+    )
+
+
+def load_catalog() -> Dict[str, Mapping[str, Any]]:
+    """Load impressions, FAQ and bot data for every language of
+    ``BOT_LANGUAGES``.
+
+    The models keep the texts only in Russian and English, so the other
+    languages get the English texts.
+
+    Returns:
+        :obj:`dict`: Immutable catalog snapshots by language.
+    """
+    impressions = list(Impression.objects.filter(availability=True))
+    faqs = list(Faq.objects.all())
+    bot = BotData.objects.first() or BotData()
+
+    catalog = {}
+    for language in settings.BOT_LANGUAGES:
+        russian = language == 'russian'
+        language_impressions = tuple(
+            MappingProxyType({
+                'id': impression.id,
+                'number': impression.number,
+                'name': (
+                    impression.name if russian else impression.english_name
+                ),
+                'price': (
+                    f'{impression.price_in_rubles} ₽'
+                    if russian
+                    else f'{impression.price_in_euros} €'
+                ),
+                'url': (
+                    impression.url_for_russians
+                    if russian
+                    else impression.url_for_english
+                )
+            })
+            for impression in impressions
+        )
+        faq_details = MappingProxyType({
+            faq.id: MappingProxyType({
+                'id': faq.id,
+                'question': (
+                    faq.russian_question if russian else faq.english_question
+                ),
+                'answer': faq.russian_answer if russian else faq.english_answer
+            })
+            for faq in faqs
+        })
+        catalog[language] = MappingProxyType({
+            'impressions': language_impressions,
+            'impressions_by_id': MappingProxyType({
+                impression['id']: impression
+                for impression in language_impressions
+            }),
+            'faq_details': faq_details,
+            'faq_questions': tuple(
+                MappingProxyType({
+                    'id': faq.id,
+                    'question': faq_details[faq.id]['question']
+                })
+                for faq in faqs
+                if faq.availability
+            ),
+            'payment_details': (
+                bot.russian_payment_details
+                if russian
+                else bot.english_payment_details
+            ),
+            'policy_url': (
+                bot.russian_policy_url if russian else bot.english_policy_url
+            ),
+            'self_delivery_point': MappingProxyType({
+                'address': (
+                    bot.russian_self_delivery_address
+                    if russian
+                    else bot.english_self_delivery_address
+                ),
+                'opening_hours': (
+                    bot.russian_self_delivery_hours
+                    if russian
+                    else bot.english_self_delivery_hours
+                )
+            })
+        })
+    return catalog
+
+
+class VersionStamp():
+    """Share the version of cached data between processes through a file.
+
+    The process which changes the data calls :meth:`bump`, which writes a
+    new version to the file. The processes caching the data call
+    :meth:`changed`, which reads the file at most once in
+    ``check_interval`` seconds.
+    """
+    def __init__(self, path: Path, check_interval: float):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._version = self._read()
+        self._checked_at = time.monotonic()
+
+    def _read(self) -> str:
+        try:
+            return self.path.read_text()
+        except FileNotFoundError:
+            return ''
+
+    def bump(self) -> None:
+        """Write a new version to the file.
+
+        Every call writes its own temporary file, so processes and threads
+        bumping the version at once do not race. A failed write is logged
+        and not raised, so it does not fail the save which changed the
+        data.
+        """
+        version = uuid.uuid4().hex
+        temporary_path = None
+        try:
+            file_descriptor, temporary_path = tempfile.mkstemp(
+                dir=self.path.parent,
+                prefix=f'{self.path.name}.',
+                suffix='.tmp'
+            )
+            with open(file_descriptor, 'w') as temporary_file:
+                temporary_file.write(version)
+            os.replace(temporary_path, self.path)
+        except OSError:
+            logger.exception('Failed to write version to %s', self.path)
+            if temporary_path is not None and os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            return
+        self._version = version
+
+    def changed(self) -> bool:
+        """Check whether the version has changed since the last check."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+
+        self._checked_at = now
+        version = self._read()
+        if version == self._version:
+            return False
+
+        self._version = version
+        return True
+
+
+class CatalogCache():
+    """Keep the catalog of impressions, FAQ and bot data in memory.
+
+    The catalog is loaded on the first request after start or after
+    :meth:`invalidate`, which is called when Impression, Faq or BotData
+    are saved or deleted. Changes made in another process, e.g. in the
+    admin, are noticed through the ``stamp`` within its check interval.
+    """
+    def __init__(self, stamp: VersionStamp):
+        self.stamp = stamp
+        self.hits = 0
+        self.misses = 0
+        self._catalog: Optional[Dict[str, Mapping[str, Any]]] = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def peek(self, language: str) -> Optional[Mapping[str, Any]]:
+        """Return the catalog snapshot for the language if it is loaded."""
+        if self.stamp.changed():
+            self.invalidate()
+
+        catalog = self._catalog
+        if catalog is None:
+            return None
+
+        self.hits += 1
+        return self._get_snapshot(catalog, language)
+
+    def get(self, language: str) -> Mapping[str, Any]:
+        """Return the catalog snapshot for the language."""
+        catalog = self.peek(language)
+        if catalog is not None:
+            return catalog
+
+        with self._lock:
+            if self._catalog is None:
+                self.misses += 1
+                version = self._version
+                catalog = load_catalog()
+                if version == self._version:
+                    self._catalog = catalog
+            else:
+                self.hits += 1
+                catalog = self._catalog
+        return self._get_snapshot(catalog, language)
+
+    @staticmethod
+    def _get_snapshot(
+        catalog: Dict[str, Mapping[str, Any]],
+        language: str
+    ) -> Mapping[str, Any]:
+        """Return the snapshot for the language or, if the language is
+        not in ``BOT_LANGUAGES``, for ``BOT_DEFAULT_LANGUAGE``.
+        """
+        snapshot = catalog.get(language)
+        if snapshot is None:
+            snapshot = catalog[settings.BOT_DEFAULT_LANGUAGE]
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Drop the catalog, so that it is loaded again on next request."""
+        self._version += 1
+        self._catalog = None
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache counters."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+catalog_cache = CatalogCache(
+    VersionStamp(
+        settings.CATALOG_VERSION_FILE,
+        settings.CATALOG_CHECK_INTERVAL
+    )
+)
+
+
+class CertificateFilter():
+    """Reject certificate codes which can not be activated without a query.
+
+    The filter keeps the sorted ids of all certificates in memory. It is
+    loaded on the first lookup after start or after :meth:`invalidate`,
+    which is called when Certificate is saved or deleted. Changes made in
+    another process are noticed through the ``stamp``. A code missing
+    from ids loaded longer than the check interval of the ``stamp`` ago
+    is looked up again in freshly loaded ids, so a certificate issued in
+    another process is not rejected before its version is noticed.
+    """
+    # Codes are read like int() reads them, within the range of
+    # Certificate.certificate_id.
+    CODE_PATTERN = re.compile(r'[+-]?[0-9]{1,10}')
+    MIN_CERTIFICATE_ID = -2 ** 31
+    MAX_CERTIFICATE_ID = 2 ** 31 - 1
+
+    def __init__(self, stamp: VersionStamp):
+        self.stamp = stamp
+        self.rejected = 0
+        self.forwarded = 0
+        self._certificate_ids: Optional[array] = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _load(self) -> array:
+        with self._lock:
+            if self._certificate_ids is None:
+                version = self._version
+                loaded_at = time.monotonic()
+                certificate_ids = array(
+                    'q',
+                    Certificate.objects.order_by('certificate_id')
+                    .values_list('certificate_id', flat=True)
+                )
+                if version != self._version:
+                    return certificate_ids
+                self._certificate_ids = certificate_ids
+                self._loaded_at = loaded_at
+            return self._certificate_ids
+
+    @staticmethod
+    def _find(certificate_ids: array, certificate_id: int) -> bool:
+        index = bisect_left(certificate_ids, certificate_id)
+        return (
+            index < len(certificate_ids) and
+            certificate_ids[index] == certificate_id
+        )
+
+    def _count(self, found: bool) -> bool:
+        if found:
+            self.forwarded += 1
+        else:
+            self.rejected += 1
+        return found
+
+    def peek(self, code: str) -> Optional[bool]:
+        """Check the code like ``in`` does if the ids are loaded.
+
+        Returns:
+            :obj:`bool` | :obj:`None`: ``None`` if the ids are not loaded
+            or the code is missing from ids which have to be loaded again.
+        """
+        if self.stamp.changed():
+            self.invalidate()
+
+        certificate_id = self._parse(code)
+        if certificate_id is None:
+            self.rejected += 1
+            return False
+
+        certificate_ids = self._certificate_ids
+        if certificate_ids is None:
+            return None
+
+        found = self._find(certificate_ids, certificate_id)
+        if (
+            not found and
+            time.monotonic() - self._loaded_at >= self.stamp.check_interval
+        ):
+            self.invalidate()
+            return None
+        return self._count(found)
+
+    def __contains__(self, code: str) -> bool:
+        """Check whether a certificate with the code may exist."""
+        found = self.peek(code)
+        if found is None:
+            found = self._count(
+                self._find(self._load(), self._parse(code))
+            )
+        return found
+
+    def _parse(self, code: str) -> Optional[int]:
+        """Return the certificate id of the code, or ``None`` if no
+        certificate can have it.
+        """
+        code = code.strip()
+        if not self.CODE_PATTERN.fullmatch(code):
+            return None
+
+        certificate_id = int(code)
+        if not (
+            self.MIN_CERTIFICATE_ID <= certificate_id <=
+            self.MAX_CERTIFICATE_ID
+        ):
+            return None
+        return certificate_id
+
+    def invalidate(self) -> None:
+        """Drop the ids, so that they are loaded again on next lookup."""
+        self._version += 1
+        self._certificate_ids = None
+
+    def stats(self) -> Dict[str, int]:
+        """Return the filter counters."""
+        return {'rejected': self.rejected, 'forwarded': self.forwarded}
+
+
+certificate_filter = CertificateFilter(
+    VersionStamp(
+        settings.CERTIFICATES_VERSION_FILE,
+        settings.CATALOG_CHECK_INTERVAL
+    )
+)
+
+
+def _get_application_language(language: str) -> str:
+    """Return the SupportApplication language of the chat language."""
+    if language == 'russian':
+        return SupportApplication.RUSSIAN_LANGUAGE
+    return SupportApplication.ENGLISH_LANGUAGE
+
+
+def _queue_support_application(
+    chat_id: int,
+    tg_username: str,
+    language: str,
+    request_type: str
+) -> None:
+    """Queue SupportApplication of an activation problem or a question."""
+    support_application_outbox.put(
+        chat_id=int(chat_id),
+        tg_username=tg_username,
+        language=_get_application_language(language),
+        request_type=(
+            SupportApplication.ACTIVATION_PROBLEM
+            if request_type == 'activation_problem'
+            else SupportApplication.QUESTION_FOR_OPERATOR
+        )
+    )
+
+
+def _activate_certificate(
+    chat_id: int,
+    tg_username: str,
+    language: str,
+    certificate_id: int
+) -> Dict:
+    """Activate Certificate if available, without the filter check."""
+    today_datetime = datetime.now(tz=timezone(settings.TIME_ZONE))
+    today_date = today_datetime.date()
+
+    activated_count = Certificate.objects.filter(
+        certificate_id=int(certificate_id),
+        activated_at__isnull=True,
+        blocked=False,
+        used=False,
+        start_date__lte=today_date,
+        expiry_date__gte=today_date
+    ).update(activated_at=today_datetime)
+    if not activated_count:
+        return {'availability': False}
+
+    impression_name_field = (
+        'impression__name'
+        if language == 'russian'
+        else 'impression__english_name'
+    )
+    certificate_pk, impression_name = Certificate.objects.filter(
+        certificate_id=int(certificate_id)
+    ).values_list('pk', impression_name_field).get()
+
+    support_application_outbox.put(
+        chat_id=int(chat_id),
+        tg_username=tg_username,
+        language=_get_application_language(language),
+        request_type=SupportApplication.SUCCESSFUL_ACTIVATION,
+        certificate_id=certificate_pk
+    )
+
+    return {
+        'availability': True,
+        'impression_name': impression_name
+    }
 
 
 class Database():
     """Transfer data asynchronously between the database and the bot."""
-    @sync_to_async
+    @database_sync_to_async
     def activate_certificate(
         self,
         chat_id: int,
@@ -28,52 +494,22 @@ class Database():
         language: str,
         certificate_id: int
     ) -> Dict:
-        """Activate Certificate if available."""
-        certificate = Certificate.objects.filter(
-            certificate_id=int(certificate_id)
-        ).select_related('impression').first()
-
-        today_datetime = datetime.now(tz=timezone(settings.TIME_ZONE))
-        today_date = today_datetime.date()
-
-        availability = (
-            certificate and
-            not certificate.activated_at and
-            not certificate.blocked and
-            not certificate.used and
-            certificate.start_date <= today_date and
-            certificate.expiry_date >= today_date
-        )
-        if not availability:
-            return {'availability': False}
-
-        certificate.activated_at = today_datetime
-        certificate.save()
+        """Activate Certificate if available.
 
-        application_language = (
-            SupportApplication.RUSSIAN_LANGUAGE
-            if language == 'russian'
-            else SupportApplication.ENGLISH_LANGUAGE
-        )
-        SupportApplication.objects.create(
-            chat_id=int(chat_id),
-            tg_username=tg_username,
-            language=application_language,
-            request_type=SupportApplication.SUCCESSFUL_ACTIVATION,
-            certificate=certificate
-        )
-        impression_name = (
-            certificate.impression.name
-            if language == 'russian'
-            else certificate.impression.english_name
+        The certificate is activated by one conditional UPDATE, so of two
+        chats activating the same certificate at once only one succeeds.
+        Codes of no certificate are rejected without a query.
+        """
+        if str(certificate_id) not in certificate_filter:
+            return {'availability': False}
+        return _activate_certificate(
+            chat_id,
+            tg_username,
+            language,
+            certificate_id
         )
 
-        return {
-            'availability': availability,
-            'impression_name': impression_name
-        }
-
-    @sync_to_async
+    @database_sync_to_async
     def create_order(
         self,
         chat_id: int,
@@ -89,22 +525,17 @@ class Database():
         delivery_method: str = '',
         screenshot_stream: io.BytesIO = None
     ) -> None:
-        """Create Order."""
-        impression = Impression.objects.get(pk=impression_id)
+        """Create Order with its Customer and queue SupportApplication.
+
+        The screenshot is stored before the transaction, so the database
+        is locked only for the two statements of the transaction. If the
+        transaction fails, the stored screenshot is deleted.
+        """
         order_language = (
             Order.RUSSIAN_LANGUAGE
             if language == 'russian'
             else Order.ENGLISH_LANGUAGE
         )
-        customer, _ = Customer.objects.update_or_create(
-            chat_id=int(chat_id),
-            defaults={
-                'tg_username': tg_username,
-                'email': customer_email,
-                'fullname': customer_fullname,
-                'phone': customer_phone
-            }
-        )
         receiving_method = Order.EMAIL if email_receiving else Order.GIFT_BOX
         if delivery_method == 'courier_delivery':
             delivery_method = Order.COURIER_DELIVERY
@@ -113,48 +544,63 @@ class Database():
         else:
             delivery_method = Order.NOT_SPECIFIED
 
-        order = Order.objects.create(
-            impression=impression,
-            language=order_language,
-            customer=customer,
-            recipient_fullname=recipient_fullname,
-            recipient_contact=recipient_contact,
-            receiving_method=receiving_method,
-            delivery_method=delivery_method
-        )
-
-        if screenshot_stream:
-            screenshot_filename = f'{order.id}.jpg'
-            screenshot_file = InMemoryUploadedFile(
-                screenshot_stream,
-                field_name='payment_screenshot',
-                name=screenshot_filename,
-                content_type='image/jpeg',
-                size=screenshot_stream.getbuffer().nbytes,
-                charset=None
-            )
-            order.payment_screenshot = screenshot_file
-            order.save()
-
-        application_language = (
-            SupportApplication.RUSSIAN_LANGUAGE
-            if language == 'russian'
-            else SupportApplication.ENGLISH_LANGUAGE
-        )
         request_type = (
             SupportApplication.EMAIL_ORDER
             if email_receiving
             else SupportApplication.GIFTBOX_ORDER
         )
-        SupportApplication.objects.create(
-            chat_id=chat_id,
+
+        screenshot_field = Order._meta.get_field('payment_screenshot')
+        screenshot_name = None
+        if screenshot_stream:
+            screenshot_name = screenshot_field.storage.save(
+                screenshot_field.generate_filename(
+                    None,
+                    f'{chat_id}_{uuid.uuid4().hex}.jpg'
+                ),
+                File(screenshot_stream)
+            )
+
+        try:
+            with transaction.atomic():
+                Customer.objects.bulk_create(
+                    [
+                        Customer(
+                            chat_id=int(chat_id),
+                            tg_username=tg_username,
+                            email=customer_email,
+                            fullname=customer_fullname,
+                            phone=customer_phone
+                        )
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['chat_id'],
+                    update_fields=['tg_username', 'email', 'fullname', 'phone']
+                )
+                order = Order.objects.create(
+                    impression_id=int(impression_id),
+                    language=order_language,
+                    customer_id=int(chat_id),
+                    recipient_fullname=recipient_fullname,
+                    recipient_contact=recipient_contact,
+                    receiving_method=receiving_method,
+                    delivery_method=delivery_method,
+                    payment_screenshot=screenshot_name
+                )
+        except Exception:
+            if screenshot_name:
+                screenshot_field.storage.delete(screenshot_name)
+            raise
+
+        support_application_outbox.put(
+            chat_id=int(chat_id),
             tg_username=tg_username,
-            language=application_language,
+            language=_get_application_language(language),
             request_type=request_type,
-            order=order
+            order_id=order.pk
         )
 
-    @sync_to_async
+    @database_sync_to_async
     def create_support_application(
         self,
         chat_id: int,
@@ -162,140 +608,157 @@ class Database():
         language: str,
         request_type: str
     ) -> None:
-        """Create SupportApplication."""
-        application_language = (
-            SupportApplication.RUSSIAN_LANGUAGE
-            if language == 'russian'
-            else SupportApplication.ENGLISH_LANGUAGE
+        """Queue SupportApplication."""
+        _queue_support_application(
+            chat_id,
+            tg_username,
+            language,
+            request_type
         )
-        application_request_type = (
-            SupportApplication.ACTIVATION_PROBLEM
-            if request_type == 'activation_problem'
-            else SupportApplication.QUESTION_FOR_OPERATOR
-        )
-        SupportApplication.objects.create(
-            chat_id=int(chat_id),
-            tg_username=tg_username,
-            language=application_language,
-            request_type=application_request_type,
+
+    @database_sync_to_async
+    def get_faq_detail(self, faq_id: int, language: str) -> Mapping:
+        """Get faq answer from catalog."""
+        return catalog_cache.get(language)['faq_details'].get(int(faq_id))
+
+    @database_sync_to_async
+    def get_faq_details(self, language: str) -> List[Mapping]:
+        """Get faq questions from catalog."""
+        return catalog_cache.get(language)['faq_questions']
+
+    @database_sync_to_async
+    def get_impression(self, impression_id: int, language: str) -> Mapping:
+        """Get impression from catalog."""
+        return catalog_cache.get(language)['impressions_by_id'].get(
+            int(impression_id),
+            {}
         )
 
-    @sync_to_async
-    def get_faq_detail(self, faq_id: int, language: str) -> Dict:
-        """Get faq answer from database."""
-        faq_detail = Faq.objects.filter(pk=int(faq_id)).first()
-        if language == 'russian':
-            return {
-                'question': faq_detail.russian_question,
-                'answer': faq_detail.russian_answer
-            }
-        else:
-            return {
-                'question': faq_detail.english_question,
-                'answer': faq_detail.english_answer
-            }
-
-    @sync_to_async
-    def get_faq_details(self, language: str) -> List[Dict]:
-        """Get faq questions from database."""
-        faq_details = Faq.objects.filter(availability=True)
-        if language == 'russian':
-            return [
-                {
-                    'id': faq_detail.id,
-                    'question': faq_detail.russian_question,
-                }
-                for faq_detail in faq_details
-            ]
-
-        return [
-            {
-                'id': faq_detail.id,
-                'question': faq_detail.english_question,
-            }
-            for faq_detail in faq_details
-        ]
-
-    @sync_to_async
-    def get_impression(self, impression_id: int, language: str) -> Dict:
-        """Get impression from database."""
-        impression = Impression.objects.filter(
-            id=int(impression_id),
-            availability=True
-        ).first()
-        if not impression:
-            return {}
-
-        if language == 'russian':
-            return {
-                'id': impression.id,
-                'number': impression.number,
-                'name': impression.name,
-                'price': f'{impression.price_in_rubles} ₽'
-            }
-        return {
-            'id': impression.id,
-            'number': impression.number,
-            'name': impression.english_name,
-            'price': f'{impression.price_in_euros} €'
-        }
-
-    @sync_to_async
-    def get_impressions(self, language: str) -> List[Dict]:
-        """Get impressions from database."""
-        impressions = Impression.objects.filter(availability=True)
-        if language == 'russian':
-            return [
-                {
-                    'id': impression.id,
-                    'number': impression.number,
-                    'name': impression.name,
-                    'price': f'{impression.price_in_rubles} ₽',
-                    'url': impression.url_for_russians
-                }
-                for impression in impressions
-            ]
-
-        return [
-            {
-                'id': impression.id,
-                'number': impression.number,
-                'name': impression.english_name,
-                'price': f'{impression.price_in_euros} €',
-                'url': impression.url_for_english
-            }
-            for impression in impressions
-        ]
+    @database_sync_to_async
+    def get_impressions(self, language: str) -> List[Mapping]:
+        """Get impressions from catalog."""
+        return catalog_cache.get(language)['impressions']
 
-    @sync_to_async
+    @database_sync_to_async
     def get_payment_details(self, language: str) -> str:
-        """Get payment details from database."""
-        bot = BotData.objects.all()
-        if language == 'russian':
-            return bot[0].russian_payment_details
+        """Get payment details from catalog."""
+        return catalog_cache.get(language)['payment_details']
 
-        return bot[0].english_payment_details
-
-    @sync_to_async
+    @database_sync_to_async
     def get_policy_url(self, language: str) -> str:
-        """Get Privacy policy url from database."""
-        bot = BotData.objects.all()
-        if language == 'russian':
-            return bot[0].russian_policy_url
-
-        return bot[0].english_policy_url
-
-    @sync_to_async
-    def get_self_delivery_point(self, language: str) -> Dict:
-        """Get details of self-delivery point from database."""
-        bot = BotData.objects.all()
-        if language == 'russian':
-            return {
-                'address': bot[0].russian_self_delivery_address,
-                'opening_hours': bot[0].russian_self_delivery_hours
-            }
-
-        return {
-            'address': bot[0].english_self_delivery_address,
-            'opening_hours': bot[0].english_self_delivery_hours
-        }
+        """Get Privacy policy url from catalog."""
+        return catalog_cache.get(language)['policy_url']
+
+    @database_sync_to_async
+    def get_self_delivery_point(self, language: str) -> Mapping:
+        """Get details of self-delivery point from catalog."""
+        return catalog_cache.get(language)['self_delivery_point']
+
+
+class AsyncDatabase(Database):
+    """Transfer data between the database and the bot in the event loop.
+
+    The cached catalog is read without leaving the event loop, a thread
+    is used only to load it. Codes of no certificate are rejected in the
+    event loop as well, and so are support applications queued once the
+    outbox is open. The rest of the calls run the same ORM queries as
+    :class:`Database` in a thread: the async ORM methods of Django run
+    every query in a thread as well, so they would take a thread switch
+    per query instead of one per call. Creating orders also needs a
+    transaction, which the async ORM does not support.
+    """
+    async def _get_catalog(self, language: str) -> Mapping[str, Any]:
+        catalog = catalog_cache.peek(language)
+        if catalog is None:
+            catalog = await database_sync_to_async(catalog_cache.get)(
+                language
+            )
+        return catalog
+
+    async def activate_certificate(
+        self,
+        chat_id: int,
+        tg_username: str,
+        language: str,
+        certificate_id: int
+    ) -> Dict:
+        """Activate Certificate if available."""
+        found = certificate_filter.peek(str(certificate_id))
+        if found is None:
+            return await super().activate_certificate(
+                chat_id=chat_id,
+                tg_username=tg_username,
+                language=language,
+                certificate_id=certificate_id
+            )
+        if not found:
+            return {'availability': False}
+        return await database_sync_to_async(_activate_certificate)(
+            chat_id,
+            tg_username,
+            language,
+            certificate_id
+        )
+
+    async def create_support_application(
+        self,
+        chat_id: int,
+        tg_username: str,
+        language: str,
+        request_type: str
+    ) -> None:
+        """Queue SupportApplication."""
+        if not support_application_outbox.is_open:
+            await super().create_support_application(
+                chat_id=chat_id,
+                tg_username=tg_username,
+                language=language,
+                request_type=request_type
+            )
+            return
+
+        _queue_support_application(
+            chat_id,
+            tg_username,
+            language,
+            request_type
+        )
+
+    async def get_faq_detail(self, faq_id: int, language: str) -> Mapping:
+        """Get faq answer from catalog."""
+        catalog = await self._get_catalog(language)
+        return catalog['faq_details'].get(int(faq_id))
+
+    async def get_faq_details(self, language: str) -> List[Mapping]:
+        """Get faq questions from catalog."""
+        catalog = await self._get_catalog(language)
+        return catalog['faq_questions']
+
+    async def get_impression(
+        self,
+        impression_id: int,
+        language: str
+    ) -> Mapping:
+        """Get impression from catalog."""
+        catalog = await self._get_catalog(language)
+        return catalog['impressions_by_id'].get(int(impression_id), {})
+
+    async def get_impressions(self, language: str) -> List[Mapping]:
+        """Get impressions from catalog."""
+        catalog = await self._get_catalog(language)
+        return catalog['impressions']
+
+    async def get_payment_details(self, language: str) -> str:
+        """Get payment details from catalog."""
+        catalog = await self._get_catalog(language)
+        return catalog['payment_details']
+
+    async def get_policy_url(self, language: str) -> str:
+        """Get Privacy policy url from catalog."""
+        catalog = await self._get_catalog(language)
+        return catalog['policy_url']
+
+    async def get_self_delivery_point(self, language: str) -> Mapping:
+        """Get details of self-delivery point from catalog."""
+        catalog = await self._get_catalog(language)
+        return catalog['self_delivery_point']
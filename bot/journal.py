@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, TextIO, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+class Journal():
+    """Keep records in an append-only local log file.
+
+    Every record is appended to the log as a JSON line and handed over to
+    the OS right away, so records survive the process being killed. The
+    log is compacted into a snapshot file, which replaces all the records
+    appended before, and the log starts over.
+
+    A process reading and compacting the journal takes it with
+    :meth:`lock` first, so that two processes started with the same path
+    do not read the same records or drop the records of each other.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.snapshot_path = self.path.with_name(f'{self.path.name}.snapshot')
+        self.lock_path = self.path.with_name(f'{self.path.name}.lock')
+        self.records_count = 0
+        self._file: Optional[TextIO] = None
+        self._lock_file: Optional[TextIO] = None
+
+    def lock(self) -> bool:
+        """Take the journal until :meth:`unlock` or the process exits.
+
+        Returns:
+            :obj:`bool`: ``False`` if the journal is taken by another
+            process.
+        """
+        if self._lock_file is not None:
+            return True
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def unlock(self) -> None:
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def open(self) -> None:
+        """Open the log for appending records."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, record: Any) -> None:
+        """Append the record to the log."""
+        self._file.write(
+            json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        )
+        self._file.write('\n')
+        self._file.flush()
+        self.records_count += 1
+
+    def read(self) -> List[Any]:
+        """Return the records of the snapshot followed by the log records.
+
+        A record torn by a crash in the middle of writing can only be the
+        last one in the log, so it is skipped.
+        """
+        records = []
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, encoding='utf-8') as snapshot:
+                records.extend(json.load(snapshot))
+
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as log:
+                for line in log:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logger.warning('Skipped torn record of %s', self.path)
+                        break
+        return records
+
+    def compact(self, records: Iterable[Any]) -> None:
+        """Replace the snapshot with the records and start the log over."""
+        temporary_path = self.snapshot_path.with_name(
+            f'{self.snapshot_path.name}.tmp'
+        )
+        with open(temporary_path, 'w', encoding='utf-8') as snapshot:
+            json.dump(
+                list(records),
+                snapshot,
+                ensure_ascii=False,
+                separators=(',', ':')
+            )
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+
+        reopen = self._file is not None
+        self.close()
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        self.records_count = 0
+        if reopen:
+            self.open()
@@ -0,0 +1,78 @@
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from .messages import MessageCatalog
+
+# A row of a layout is a sequence of buttons, a button is the key of its
+# text in the message catalog and its callback data.
+KeyboardLayout = Sequence[Sequence[Tuple[str, str]]]
+
+
+class StaticInlineKeyboardMarkup(InlineKeyboardMarkup):
+    """Inline keyboard which is sent many times without changes.
+
+    Telegram objects are immutable, so the dict sent to the Bot API is
+    made on the first request and reused by the next ones.
+    """
+    __slots__ = ('_dict',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self._unfrozen():
+            self._dict: Optional[Dict[str, Any]] = None
+
+    def to_dict(self, recursive: bool = True) -> Dict[str, Any]:
+        if not recursive:
+            return super().to_dict(recursive=False)
+
+        if self._dict is None:
+            with self._unfrozen():
+                self._dict = super().to_dict()
+        return self._dict
+
+
+def make_keyboard(
+    rows: Iterable[Iterable[Tuple[str, str]]]
+) -> StaticInlineKeyboardMarkup:
+    """Make a keyboard of the rows of button texts and callback data."""
+    return StaticInlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(text, callback_data=callback_data)
+            for text, callback_data in row
+        ]
+        for row in rows
+    ])
+
+
+class KeyboardRegistry():
+    """Keep the static keyboards of the bot made once for every language.
+
+    The keyboards are made from their layouts when the registry is
+    created, and the same keyboard object is returned every time.
+    """
+    def __init__(
+        self,
+        layouts: Mapping[str, KeyboardLayout],
+        message_catalogs: Mapping[str, MessageCatalog]
+    ):
+        self.layouts = layouts
+        self._keyboards: Dict[Tuple[str, str], StaticInlineKeyboardMarkup] = {
+            (name, language): make_keyboard(
+                (
+                    (messages[text_key], callback_data)
+                    for text_key, callback_data in row
+                )
+                for row in layout
+            )
+            for name, layout in layouts.items()
+            for language, messages in message_catalogs.items()
+        }
+
+    def get(
+        self,
+        name: str,
+        messages: MessageCatalog
+    ) -> StaticInlineKeyboardMarkup:
+        """Return the keyboard in the language of the messages."""
+        return self._keyboards[name, messages.language]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bot.archive import archive_stale_chats
+
+
+class Command(BaseCommand):
+    help = 'Move chats idle for a long time from ChatData to the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-days',
+            type=int,
+            default=settings.CHAT_ARCHIVE_IDLE_DAYS,
+            help='Archive chats idle for longer than this number of days'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.CHAT_ARCHIVE_BATCH_SIZE,
+            help='How many chats to move in one transaction'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=settings.CHAT_ARCHIVE_PAUSE,
+            help='Seconds to wait between transactions'
+        )
+
+    def handle(self, *args, **options):
+        archived_count = archive_stale_chats(
+            idle_days=options['idle_days'],
+            batch_size=options['batch_size'],
+            pause=options['pause']
+        )
+        self.stdout.write(f'Archived chats: {archived_count}')
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from bot.models import ChatData
+from bot.persistence import ChatSession
+
+
+class Command(BaseCommand):
+    help = (
+        'Move next_state and language of chats from ChatData.data '
+        'to their own columns'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='How many chats to convert in one query'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        converted_count = 0
+        last_chat_id = -1
+        while True:
+            chats = list(
+                ChatData.objects.filter(chat_id__gt=last_chat_id)
+                .order_by('chat_id')
+                .only('chat_id', 'next_state', 'language', 'data')
+                [:batch_size]
+            )
+            if not chats:
+                break
+
+            last_chat_id = chats[-1].chat_id
+            converted_chats = []
+            for chat in chats:
+                if not isinstance(chat.data, dict):
+                    continue
+                if not any(key in chat.data for key in ChatSession.COLUMNS):
+                    continue
+
+                session = ChatSession.from_row(
+                    chat.next_state,
+                    chat.language,
+                    chat.data
+                )
+                for field, value in session.to_row().items():
+                    setattr(chat, field, value)
+                converted_chats.append(chat)
+
+            ChatData.objects.bulk_update(
+                converted_chats,
+                ['next_state', 'language', 'data']
+            )
+            converted_count += len(converted_chats)
+
+        self.stdout.write(f'Converted chats: {converted_count}')
@@ -0,0 +1,81 @@
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pytz import timezone
+
+from bot.certificates import issue_certificates, issue_certificates_for_orders
+from bot.models import Impression, Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Issue certificates for confirmed orders without certificates '
+        'or a number of certificates for an impression'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--impression',
+            type=int,
+            help='Number of the impression to issue certificates for'
+        )
+        parser.add_argument(
+            '--count',
+            type=int,
+            help='How many certificates to issue for the impression'
+        )
+        parser.add_argument(
+            '--start-date',
+            type=date.fromisoformat,
+            help='First day of the certificates, YYYY-MM-DD, today by default'
+        )
+        parser.add_argument(
+            '--valid-days',
+            type=int,
+            default=365,
+            help='How many days the certificates are valid'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.CERTIFICATE_ISSUE_BATCH_SIZE,
+            help='How many certificates to insert in one statement'
+        )
+
+    def handle(self, *args, **options):
+        start_date = (
+            options['start_date'] or
+            datetime.now(tz=timezone(settings.TIME_ZONE)).date()
+        )
+        expiry_date = start_date + timedelta(days=options['valid_days'])
+
+        if options['impression'] is None:
+            certificates = issue_certificates_for_orders(
+                Order.objects.filter(confirmed=True),
+                start_date=start_date,
+                expiry_date=expiry_date,
+                batch_size=options['batch_size']
+            )
+        else:
+            if not options['count']:
+                raise CommandError('--count is required with --impression')
+            try:
+                impression = Impression.objects.get(
+                    number=options['impression']
+                )
+            except Impression.DoesNotExist:
+                raise CommandError(
+                    f"Impression №{options['impression']} does not exist"
+                )
+            certificates = issue_certificates(
+                impression,
+                options['count'],
+                start_date=start_date,
+                expiry_date=expiry_date,
+                batch_size=options['batch_size']
+            )
+
+        for certificate in certificates:
+            self.stdout.write(str(certificate.certificate_id))
+        self.stderr.write(f'Issued certificates: {len(certificates)}')
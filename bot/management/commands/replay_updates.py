@@ -0,0 +1,111 @@
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def generate_updates(count: int):
+    """Make /start messages from different chats."""
+    for update_id in range(1, count + 1):
+        chat_id = 1000000 + update_id
+        yield {
+            'update_id': update_id,
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {
+                    'id': chat_id,
+                    'is_bot': False,
+                    'first_name': 'Replay',
+                    'username': f'replay{update_id}'
+                },
+                'text': '/start',
+                'entities': [
+                    {'type': 'bot_command', 'offset': 0, 'length': 6}
+                ]
+            }
+        }
+
+
+class Command(BaseCommand):
+    help = 'Post recorded or generated updates to the bot webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            nargs='?',
+            help='JSON lines file with an update on every line'
+        )
+        parser.add_argument(
+            '--generate',
+            type=int,
+            default=0,
+            help='Post this number of generated /start messages instead'
+        )
+        parser.add_argument(
+            '--url',
+            required=True,
+            help='Webhook URL of a local or test bot to post the updates to'
+        )
+        parser.add_argument(
+            '--secret-token',
+            default='',
+            help='Secret token of the webhook'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help='How many updates to post at the same time'
+        )
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            updates = list(generate_updates(options['generate']))
+        elif options['file']:
+            with open(options['file'], encoding='utf-8') as updates_file:
+                updates = [
+                    json.loads(line)
+                    for line in updates_file
+                    if line.strip()
+                ]
+        else:
+            raise CommandError('Pass a file of updates or --generate')
+
+        headers = {'Content-Type': 'application/json'}
+        if options['secret_token']:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = (
+                options['secret_token']
+            )
+
+        def post_update(update):
+            request = Request(
+                options['url'],
+                data=json.dumps(update).encode(),
+                headers=headers,
+                method='POST'
+            )
+            try:
+                with urlopen(request, timeout=30) as response:
+                    return response.status
+            except HTTPError as error:
+                return error.code
+            except URLError as error:
+                return str(error.reason)
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            statuses = Counter(executor.map(post_update, updates))
+        elapsed = time.perf_counter() - started_at
+
+        for status, count in sorted(statuses.items(), key=str):
+            self.stdout.write(f'{status}: {count}')
+        self.stdout.write(
+            f'Posted {len(updates)} updates in {elapsed:.2f} s, '
+            f'{len(updates) / elapsed:.0f} updates/s'
+        )
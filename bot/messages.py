@@ -0,0 +1,121 @@
+import json
+import re
+from pathlib import Path
+from string import Formatter
+from typing import Any, Dict, Iterable, Mapping, Tuple
+
+MESSAGE_CATALOGS_DIR = Path(__file__).resolve().parent / 'message_catalogs'
+
+MARKDOWN_SPECIAL_CHARACTERS = '_[]()~`>#+-=|{}.!'
+MARKDOWN_ESCAPES = tuple(
+    (character, f'\\{character}')
+    for character in MARKDOWN_SPECIAL_CHARACTERS
+)
+UNESCAPED_CHARACTER_PATTERN = re.compile(
+    r'(?<!\\)([{}])'.format(re.escape(MARKDOWN_SPECIAL_CHARACTERS))
+)
+
+
+def escape_markdown(text: str) -> str:
+    """Escape the text for MarkdownV2 of Telegram.
+
+    ``*`` is left as it is to keep bold text, and a character already
+    escaped with a backslash is not escaped again. A replace per special
+    character runs in C, which is many times faster than a translate
+    table or a regular expression, so the slower regular expression is
+    only used for a text with backslashes.
+    """
+    if '\\' in text:
+        return UNESCAPED_CHARACTER_PATTERN.sub(r'\\\1', text)
+    for character, escaped_character in MARKDOWN_ESCAPES:
+        if character in text:
+            text = text.replace(character, escaped_character)
+    return text
+
+
+class MessageCatalog():
+    """Keep the messages of the bot in one language.
+
+    A message is a ``str.format`` template. Its MarkdownV2 version is made
+    when the catalog is loaded: the text around the fields is escaped
+    once, and only the field values are escaped when the message is sent.
+    A message with hand-written MarkdownV2 markup, such as a link, is
+    sent in the plain version.
+    """
+    def __init__(self, language: str, messages: Mapping[str, str]):
+        self.language = language
+        self._texts: Dict[str, str] = {}
+        self._markdown_texts: Dict[str, str] = {}
+        self._templates: Dict[str, Tuple[str, str]] = {}
+        for key, template in messages.items():
+            literals_and_fields = list(Formatter().parse(template))
+            if all(field is None for _, field, _, _ in literals_and_fields):
+                text = ''.join(
+                    literal
+                    for literal, _, _, _ in literals_and_fields
+                )
+                self._texts[key] = text
+                self._markdown_texts[key] = escape_markdown(text)
+                continue
+
+            markdown_template = ''
+            for literal, field, format_spec, conversion in literals_and_fields:
+                markdown_template += (
+                    escape_markdown(literal)
+                    .replace('{', '{{')
+                    .replace('}', '}}')
+                )
+                if field is not None:
+                    markdown_template += '{%s%s%s}' % (
+                        field,
+                        f'!{conversion}' if conversion else '',
+                        f':{format_spec}' if format_spec else ''
+                    )
+            self._templates[key] = (template, markdown_template)
+
+    def __getitem__(self, key: str) -> str:
+        """Return the plain text of the message without fields."""
+        return self._texts[key]
+
+    def text(self, key: str, **fields: Any) -> str:
+        """Return the plain text of the message with the fields."""
+        if key in self._texts:
+            return self._texts[key]
+        return self._templates[key][0].format_map(fields)
+
+    def markdown(self, key: str, **fields: Any) -> str:
+        """Return the MarkdownV2 text of the message with the fields
+        escaped.
+        """
+        if key in self._markdown_texts:
+            return self._markdown_texts[key]
+        return self._templates[key][1].format_map({
+            name: escape_markdown(str(value))
+            for name, value in fields.items()
+        })
+
+
+def load_message_catalogs(
+    languages: Iterable[str]
+) -> Dict[str, MessageCatalog]:
+    """Load the message catalogs of the languages in the given order.
+
+    Every catalog must have the same messages as the first one, so that a
+    missing translation fails at startup rather than in a chat.
+    """
+    catalogs: Dict[str, MessageCatalog] = {}
+    keys = None
+    for language in languages:
+        path = MESSAGE_CATALOGS_DIR / f'{language}.json'
+        with open(path, encoding='utf-8') as catalog_file:
+            messages = json.load(catalog_file)
+
+        if keys is None:
+            keys = messages.keys()
+        elif messages.keys() != keys:
+            raise ValueError(
+                f'Messages of {path.name} differ from the other catalogs: '
+                f'{", ".join(sorted(messages.keys() ^ keys))}'
+            )
+        catalogs[language] = MessageCatalog(language, messages)
+    return catalogs
@@ -66,7 +66,20 @@ class ChatData(models.Model):
         auto_now=True,
         db_index=True,
     )
-    data = models.JSONField()
+    next_state = models.PositiveSmallIntegerField(
+        'Состояние диалога',
+        null=True,
+        blank=True,
+        db_index=True
+    )
+    language = models.CharField(
+        'Язык',
+        max_length=16,
+        default='',
+        blank=True,
+        db_index=True
+    )
+    data = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ['-called_at']
@@ -74,6 +87,24 @@ class ChatData(models.Model):
         verbose_name_plural = 'чаты'
 
 
+class ArchivedChatData(models.Model):
+    chat_id = models.PositiveBigIntegerField(
+        'ID чата',
+        primary_key=True,
+        null=False,
+        blank=False
+    )
+    start_at = models.DateTimeField('Впервые обратился к боту')
+    called_at = models.DateTimeField('Последний раз общался с ботом')
+    archived_at = models.DateTimeField('Перенесён в архив', auto_now_add=True)
+    payload = models.BinaryField('Сжатые данные чата')
+
+    class Meta:
+        ordering = ['-called_at']
+        verbose_name = 'архивный чат'
+        verbose_name_plural = 'архивные чаты'
+
+
 class Impression(models.Model):
     number = models.PositiveIntegerField(r'№ п/п', unique=True)
     name = models.CharField('Наименование по-русски', max_length=256)
@@ -193,6 +224,18 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['-id'],
+                condition=models.Q(confirmed=False),
+                name='unconfirmed_order_idx'
+            ),
+            models.Index(
+                fields=['-id'],
+                condition=models.Q(confirmed=True, delivered=False),
+                name='undelivered_order_idx'
+            ),
+        ]
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
 
@@ -213,6 +256,8 @@ class Certificate(models.Model):
         on_delete=models.PROTECT,
         verbose_name='Заказ',
         related_name='certificate',
+        null=True,
+        blank=True
     )
     activated_at = models.DateTimeField('Активирован', null=True, blank=True)
     blocked = models.BooleanField('Заблокирован оператором', default=False)
@@ -220,6 +265,9 @@ class Certificate(models.Model):
 
     class Meta:
         ordering = ['-expiry_date']
+        indexes = [
+            models.Index(fields=['-expiry_date'], name='certificate_expiry_idx'),
+        ]
         verbose_name = 'сертификат'
         verbose_name_plural = 'сертификаты'
 
@@ -283,6 +331,21 @@ class SupportApplication(models.Model):
 
     class Meta:
         ordering = ['-registered_at']
+        indexes = [
+            models.Index(
+                fields=['-registered_at'],
+                name='application_registered_idx'
+            ),
+            models.Index(
+                fields=['request_type', '-registered_at'],
+                name='application_type_idx'
+            ),
+            models.Index(
+                fields=['-registered_at'],
+                condition=models.Q(closed=False),
+                name='open_application_idx'
+            ),
+        ]
         verbose_name = 'заявка на поддержку'
         verbose_name_plural = 'заявки на поддержку'
 
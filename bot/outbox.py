@@ -0,0 +1,104 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from django.conf import settings
+from django.db import transaction
+
+from .journal import Journal
+from .models import SupportApplication
+
+logger = logging.getLogger(__name__)
+
+
+class SupportApplicationOutbox():
+    """Queue support applications in a local file off the reply path.
+
+    :meth:`put` appends the fields of the application to the journal in
+    microseconds, :meth:`drain` inserts the queued applications with one
+    ``bulk_create`` and starts the journal over. The applications queued
+    before the bot was stopped are read from the journal by :meth:`open`.
+    An application may be inserted twice if the bot is killed between
+    the insert and the journal compaction.
+
+    Until the outbox is opened, applications are inserted right away,
+    and so they are in a process which finds the journal taken by
+    another process started with the same path.
+    """
+    def __init__(self, path: Optional[Union[str, Path]]):
+        self.journal = Journal(path) if path else None
+        self.is_open = False
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        """Start queueing applications and read the queued ones."""
+        if self.journal is None:
+            return
+
+        with self._lock:
+            if not self.journal.lock():
+                logger.warning(
+                    '%s is taken by another process, support applications '
+                    'are inserted right away',
+                    self.journal.path
+                )
+                return
+            self._pending = self.journal.read()
+            self.journal.open()
+            self.is_open = True
+        if self._pending:
+            logger.info(
+                'Read %d queued support applications',
+                len(self._pending)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self.is_open = False
+            if self.journal is not None:
+                self.journal.close()
+                self.journal.unlock()
+
+    def put(self, **fields: Any) -> None:
+        """Queue SupportApplication with the fields."""
+        with self._lock:
+            if self.is_open:
+                self.journal.append(fields)
+                self._pending.append(fields)
+                return
+
+        SupportApplication.objects.create(**fields)
+
+    def drain(self) -> int:
+        """Insert the queued applications.
+
+        Returns:
+            :obj:`int`: How many applications have been inserted.
+        """
+        with self._lock:
+            applications, self._pending = self._pending, []
+        if not applications:
+            return 0
+
+        try:
+            with transaction.atomic():
+                SupportApplication.objects.bulk_create(
+                    [SupportApplication(**fields) for fields in applications],
+                    batch_size=settings.SUPPORT_APPLICATION_BATCH_SIZE
+                )
+        except Exception:
+            with self._lock:
+                self._pending = applications + self._pending
+            raise
+
+        with self._lock:
+            if self.is_open:
+                self.journal.compact(self._pending)
+        return len(applications)
+
+
+support_application_outbox = SupportApplicationOutbox(
+    settings.SUPPORT_APPLICATION_OUTBOX_PATH
+)
@@ -1,8 +1,27 @@
+import asyncio
+import json
+import logging
+import time
 from asgiref.sync import sync_to_async
+from collections import OrderedDict, defaultdict
 from copy import deepcopy
-from typing import Dict, Optional
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple
+)
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
-from telegram.ext import BasePersistence, PersistenceInput
+from telegram.ext import Application, BasePersistence, PersistenceInput
 from telegram.ext._utils.types import (
     BD,
     CD,
@@ -12,12 +31,252 @@ from telegram.ext._utils.types import (
     ConversationKey
 )
 
-from .models import ChatData
+from .archive import restore_archived_chat
+from .database import database_sync_to_async
+from .journal import Journal
+from .models import ArchivedChatData, ChatData
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class ChatSession():
+    """Keep the conversation state of a chat.
+
+    Works like a :obj:`dict` with a fixed set of keys, but keeps the values
+    in slots, which takes several times less memory than a :obj:`dict`.
+    ``next_state`` and ``language`` are stored in their own columns of
+    ChatData, the rest of the keys are stored in ``ChatData.data``.
+    """
+    COLUMNS = ('next_state', 'language')
+    KEYS = frozenset((
+        'next_state',
+        'language',
+        'impression_id',
+        'receiving_method',
+        'customer_email',
+        'customer_fullname',
+        'customer_phone',
+        'delivery_method',
+        'recipient_fullname',
+        'recipient_contact',
+        'request_type'
+    ))
+    __slots__ = tuple(sorted(KEYS))
+
+    def __init__(self, data: Optional[Mapping[str, Any]] = None):
+        if data:
+            self.update(data)
+
+    @classmethod
+    def from_row(
+        cls,
+        next_state: Optional[int],
+        language: str,
+        data: Optional[Dict[str, Any]]
+    ) -> 'ChatSession':
+        """Make a session from the columns of a ChatData row.
+
+        Rows written before ``next_state`` and ``language`` got their own
+        columns keep them in ``data``, so they are taken from there.
+        """
+        session = cls()
+        if isinstance(data, dict):
+            session.update(
+                (key, value) for key, value in data.items()
+                if key in cls.KEYS
+            )
+        if next_state is not None:
+            session.next_state = next_state
+        if language:
+            session.language = language
+        return session
+
+    def diff(self, other: 'ChatSession') -> Set[str]:
+        """Return the keys whose values differ from the other session."""
+        return {
+            key for key in self.__slots__
+            if getattr(self, key, _MISSING) != getattr(other, key, _MISSING)
+        }
+
+    def to_row(self) -> Dict[str, Any]:
+        """Return the values of the ChatData columns for the session."""
+        return {
+            'next_state': self.get('next_state'),
+            'language': self.get('language') or '',
+            'data': {
+                key: value for key, value in self.items()
+                if key not in self.COLUMNS
+            }
+        }
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        delattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.KEYS and hasattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in self.__slots__ if hasattr(self, key))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ChatSession):
+            return dict(self.items()) == dict(other.items())
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    def __copy__(self) -> 'ChatSession':
+        return ChatSession(self.items())
+
+    def __deepcopy__(self, memo: Dict) -> 'ChatSession':
+        return ChatSession(self.items())
+
+    def __repr__(self) -> str:
+        return f'ChatSession({dict(self.items())!r})'
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.KEYS else default
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return ((key, getattr(self, key)) for key in self)
+
+    def update(self, data: Any) -> None:
+        items = data.items() if hasattr(data, 'items') else data
+        for key, value in items:
+            self[key] = value
+
+    def clear(self) -> None:
+        for key in list(self):
+            delattr(self, key)
+
+
+class ChatDataCache():
+    """Keep the chat data of the most recently active chats.
+
+    Chats are ordered by the last access, the same way as
+    ``ChatData.called_at``. When the cache holds more than ``max_size``
+    chats, the chats idle for the longest time are evicted.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._chats: Dict[int, CD] = OrderedDict()
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._chats
+
+    def __getitem__(self, chat_id: int) -> CD:
+        return self._chats[chat_id]
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def __setitem__(self, chat_id: int, data: CD) -> None:
+        self._chats[chat_id] = data
+        self._chats.move_to_end(chat_id)
+
+    def get(self, chat_id: int, default: Optional[CD] = None) -> Optional[CD]:
+        return self._chats.get(chat_id, default)
+
+    def pop(self, chat_id: int, default: Optional[CD] = None) -> Optional[CD]:
+        return self._chats.pop(chat_id, default)
+
+    def touch(self, chat_id: int) -> bool:
+        """Mark the chat as the most recently used one.
+
+        Returns:
+            :obj:`bool`: Whether the chat is in the cache.
+        """
+        if chat_id not in self._chats:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        self._chats.move_to_end(chat_id)
+        return True
+
+    def evict(self, keep: Iterable[int] = ()) -> List[int]:
+        """Evict the least recently used chats exceeding ``max_size``.
+
+        Args:
+            keep (Iterable[:obj:`int`]): Chats which must not be evicted.
+
+        Returns:
+            List[:obj:`int`]: The evicted chat ids.
+        """
+        excess = len(self._chats) - self.max_size
+        if excess <= 0:
+            return []
+
+        keep = set(keep)
+        evicted = []
+        for chat_id in self._chats:
+            if len(evicted) == excess:
+                break
+            if chat_id not in keep:
+                evicted.append(chat_id)
+
+        for chat_id in evicted:
+            del self._chats[chat_id]
+        self.evictions += len(evicted)
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache counters."""
+        return {
+            'size': len(self._chats),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
 
 
 class DjangoPersistence(BasePersistence):
-    """Use Django's ChatData model for making a bot persistent."""
-    def __init__(self):
+    """Use Django's ChatData model for making a bot persistent.
+
+    Changed chat data are not written to the Database right away. The
+    changed keys of every chat are collected in memory and all the chats
+    are written in bulk every ``write_interval`` seconds and on
+    :meth:`flush`, so the last change of a chat wins. Only the columns of
+    the changed keys are written: a transition to another state updates
+    just ``ChatData.next_state``.
+
+    If ``CHAT_DATA_JOURNAL_PATH`` is set, every change is also appended to
+    a local journal before it is written to the Database. Changes which
+    had not been written to the Database when the bot was stopped or
+    killed are restored from the journal on the next start.
+
+    At most ``cache_size`` chats are kept in memory. Idle chats are evicted
+    both from the persistence and from the application set with
+    :meth:`set_application`, and are reloaded on their next update.
+    """
+    def __init__(
+        self,
+        write_interval: Optional[float] = None,
+        cache_size: Optional[int] = None
+    ):
         store_data = PersistenceInput(
             chat_data=True,
             bot_data=False,
@@ -25,21 +284,109 @@ class DjangoPersistence(BasePersistence):
             callback_data=False
         )
         super().__init__(store_data=store_data, update_interval=1)
-        self.chat_data: Optional[Dict[int, CD]] = None
+        self.chat_data = ChatDataCache(
+            settings.CHAT_DATA_CACHE_SIZE
+            if cache_size is None
+            else cache_size
+        )
+        self.write_interval = (
+            settings.CHAT_DATA_WRITE_INTERVAL
+            if write_interval is None
+            else write_interval
+        )
+        self._dirty_keys: Dict[int, Set[str]] = {}
+        self._new_chat_ids: Set[int] = set()
+        self._write_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self._application: Optional[Application] = None
+        self._evicted_chat_ids: Set[int] = set()
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.journal = (
+            Journal(settings.CHAT_DATA_JOURNAL_PATH)
+            if settings.CHAT_DATA_JOURNAL_PATH
+            else None
+        )
 
-    @sync_to_async
-    def get_chat_data(self) -> Dict[int, CD]:
-        """Return the chat_data from the Database if it exists or
-           an empty :obj:`dict`.
+    def set_application(self, application: Application) -> None:
+        """Set the application whose chat data are evicted along with
+        the cached ones.
+        """
+        self._application = application
+
+    async def get_chat_data(self) -> Dict[int, CD]:
+        """Return the chats restored from the journal, if it is enabled.
+
+        Chat data are loaded from the Database lazily, chat by chat, in
+        :meth:`refresh_chat_data` when the first update of a chat arrives.
+        The journal keeps the changes appended since its last compaction,
+        and every change has the time it was appended. The last change of
+        a chat is restored unless the chat has been written to the
+        Database, or moved to the archive, since that time. The restored
+        chats are written to the Database with the next write.
+
+        Raises:
+            RuntimeError: If the journal is taken by another process.
 
         Returns:
             Dict[:obj:`int`, :obj:`dict`]: The restored chat data.
         """
-        if not self.chat_data:
-            self.chat_data = {
-                data.chat_id: data.data for data in ChatData.objects.all()
-            }
-        return deepcopy(self.chat_data)
+        if self.journal is None:
+            return {}
+
+        if not self.journal.lock():
+            raise RuntimeError(
+                f'{self.journal.path} is taken by another process'
+            )
+
+        restored_rows = {}
+        for chat_id, row, *appended_at in self.journal.read():
+            if row is None:
+                restored_rows.pop(chat_id, None)
+            else:
+                restored_rows[chat_id] = (row, appended_at)
+        self.journal.open()
+
+        written_at = await self._get_written_at(list(restored_rows))
+        restored_chat_data = {}
+        for chat_id, (row, appended_at) in restored_rows.items():
+            if (
+                appended_at and
+                chat_id in written_at and
+                written_at[chat_id] >= appended_at[0]
+            ):
+                continue
+
+            session = ChatSession.from_row(**row)
+            self.chat_data[chat_id] = session
+            self._new_chat_ids.add(chat_id)
+            self._dirty_keys[chat_id] = set(ChatSession.KEYS)
+            restored_chat_data[chat_id] = ChatSession(session.items())
+
+        if restored_chat_data:
+            logger.info(
+                'Restored %d chats from the journal',
+                len(restored_chat_data)
+            )
+            self._schedule_write()
+        return restored_chat_data
+
+    @staticmethod
+    @sync_to_async
+    def _get_written_at(chat_ids: List[int]) -> Dict[int, float]:
+        """Return when the chats were last written to ChatData or to the
+        archive, as a Unix time.
+        """
+        written_at = {}
+        for model in (ArchivedChatData, ChatData):
+            for chat_id, called_at in model.objects.filter(
+                chat_id__in=chat_ids
+            ).values_list('chat_id', 'called_at').iterator():
+                written_at[chat_id] = max(
+                    written_at.get(chat_id, 0),
+                    called_at.timestamp()
+                )
+        return written_at
 
     @sync_to_async
     def get_bot_data(self) -> BD:
@@ -57,9 +404,8 @@ class DjangoPersistence(BasePersistence):
     def get_user_data(self) -> Dict[int, UD]:
         pass
 
-    @sync_to_async
-    def update_chat_data(self, chat_id: int, data: CD) -> None:
-        """Update the chat_data and save them in Database.
+    async def update_chat_data(self, chat_id: int, data: CD) -> None:
+        """Update the chat_data and mark them for writing in Database.
 
         Args:
             chat_id (:obj:`int`): The chat the data might have been
@@ -67,18 +413,171 @@ class DjangoPersistence(BasePersistence):
             data (:obj:`dict`): The :attr:`telegram.ext.Application.chat_data`
                                            ``[chat_id]``.
         """
-        if self.chat_data is None:
-            self.chat_data = {}
+        if not isinstance(data, ChatSession):
+            data = ChatSession(data)
 
-        if self.chat_data.get(chat_id) == data:
+        previous_data = self.chat_data.get(chat_id)
+        if previous_data is None:
+            changed_keys = set(ChatSession.KEYS)
+            self._new_chat_ids.add(chat_id)
+        else:
+            changed_keys = data.diff(previous_data)
+        if not changed_keys:
             return
 
         self.chat_data[chat_id] = data
-        ChatData.objects.update_or_create(
-            chat_id=chat_id,
-            defaults={'data': data}
+        self._dirty_keys.setdefault(chat_id, set()).update(changed_keys)
+        if self.journal is not None:
+            self.journal.append([chat_id, data.to_row(), time.time()])
+        self._schedule_write()
+
+    def _schedule_write(self) -> None:
+        """Write the changed chats in ``write_interval`` seconds."""
+        if self._write_task is None:
+            self._write_task = asyncio.create_task(self._write_behind())
+
+    async def _write_behind(self) -> None:
+        """Wait for ``write_interval`` and write the changed chats."""
+        await asyncio.sleep(self.write_interval)
+        self._write_task = None
+        try:
+            await self._write_dirty_chats()
+        except Exception:
+            logger.exception('Failed to write chat data to Database')
+
+    async def _write_dirty_chats(self) -> None:
+        """Write the changed columns of all changed chats to Database."""
+        async with self._write_lock:
+            if not self._dirty_keys:
+                return
+
+            dirty_keys, self._dirty_keys = self._dirty_keys, {}
+            new_chat_ids = self._new_chat_ids.intersection(dirty_keys)
+            self._new_chat_ids -= new_chat_ids
+
+            now = timezone.now()
+            rows = {}
+            updated_rows = defaultdict(list)
+            bytes_written = 0
+            for chat_id, keys in dirty_keys.items():
+                session = self.chat_data.get(chat_id)
+                if session is None:
+                    continue
+
+                row = session.to_row()
+                rows[chat_id] = ChatData(chat_id=chat_id, **row)
+                columns = (
+                    tuple(row)
+                    if chat_id in new_chat_ids
+                    else tuple(sorted({
+                        key if key in ChatSession.COLUMNS else 'data'
+                        for key in keys
+                    }))
+                )
+                bytes_written += sum(
+                    len(json.dumps(row[column])) for column in columns
+                )
+                if chat_id not in new_chat_ids:
+                    updated_rows[columns].append(ChatData(
+                        chat_id=chat_id,
+                        called_at=now,
+                        **{column: row[column] for column in columns}
+                    ))
+
+            created_rows = [
+                rows[chat_id] for chat_id in new_chat_ids if chat_id in rows
+            ]
+            try:
+                await self._save_chat_data(created_rows, updated_rows, rows)
+            except Exception:
+                for chat_id, keys in dirty_keys.items():
+                    self._dirty_keys.setdefault(chat_id, set()).update(keys)
+                self._new_chat_ids |= new_chat_ids
+                raise
+
+            if (
+                self.journal is not None and
+                self.journal.records_count >=
+                settings.CHAT_DATA_JOURNAL_COMPACT_EVERY
+            ):
+                self._compact_journal()
+
+        self.rows_written += len(rows)
+        self.bytes_written += bytes_written
+        self._evict_idle_chats()
+        logger.debug(
+            'Chat data cache: %s, writes: %s',
+            self.chat_data.stats(),
+            self.write_stats()
         )
 
+    def _compact_journal(self) -> None:
+        """Keep in the journal only the chats not written to Database."""
+        compacted_at = time.time()
+        self.journal.compact(
+            [chat_id, self.chat_data[chat_id].to_row(), compacted_at]
+            for chat_id in self._dirty_keys
+        )
+
+    @staticmethod
+    @sync_to_async
+    def _save_chat_data(
+        created_rows: List[ChatData],
+        updated_rows: Dict[Tuple[str, ...], List[ChatData]],
+        rows: Dict[int, ChatData]
+    ) -> None:
+        """Insert the new chats and update the changed columns of the rest.
+
+        Chats whose rows have disappeared from Database because they have
+        been archived are inserted again as a whole and removed from the
+        archive.
+        """
+        with transaction.atomic():
+            for columns, column_rows in updated_rows.items():
+                updated_count = ChatData.objects.bulk_update(
+                    column_rows,
+                    [*columns, 'called_at'],
+                    batch_size=settings.CHAT_DATA_WRITE_BATCH_SIZE
+                )
+                if updated_count == len(column_rows):
+                    continue
+
+                chat_ids = [row.chat_id for row in column_rows]
+                existing_chat_ids = set(
+                    ChatData.objects.filter(chat_id__in=chat_ids)
+                    .values_list('chat_id', flat=True)
+                )
+                missing_chat_ids = [
+                    chat_id for chat_id in chat_ids
+                    if chat_id not in existing_chat_ids
+                ]
+                created_rows.extend(
+                    rows[chat_id] for chat_id in missing_chat_ids
+                )
+                ArchivedChatData.objects.filter(
+                    chat_id__in=missing_chat_ids
+                ).delete()
+
+            ChatData.objects.bulk_create(
+                created_rows,
+                batch_size=settings.CHAT_DATA_WRITE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['chat_id'],
+                update_fields=['next_state', 'language', 'data', 'called_at']
+            )
+
+    def write_stats(self) -> Dict[str, float]:
+        """Return how many chats and bytes of column values were written."""
+        return {
+            'rows_written': self.rows_written,
+            'bytes_written': self.bytes_written,
+            'bytes_per_row': (
+                self.bytes_written / self.rows_written
+                if self.rows_written
+                else 0
+            )
+        }
+
     @sync_to_async
     def update_bot_data(self, data: BD) -> None:
         pass
@@ -100,8 +599,7 @@ class DjangoPersistence(BasePersistence):
     def update_user_data(self, user_id: int, data: UD) -> None:
         pass
 
-    @sync_to_async
-    def drop_chat_data(self, chat_id: int) -> None:
+    async def drop_chat_data(self, chat_id: int) -> None:
         """Delete the specified key from the ``chat_data`` and
         save them in Database.
 
@@ -110,26 +608,86 @@ class DjangoPersistence(BasePersistence):
         Args:
             chat_id (:obj:`int`): The chat id to delete from the persistence.
         """
-        if self.chat_data is None:
+        if chat_id in self._evicted_chat_ids:
+            self._evicted_chat_ids.discard(chat_id)
+            # The application does not pass the changes of a chat dropped
+            # by eviction, so a chat which came back before the drop is
+            # written from the application's chat data.
+            if (
+                self._application is not None and
+                chat_id in self._application.chat_data
+            ):
+                await self.update_chat_data(
+                    chat_id,
+                    deepcopy(self._application.chat_data[chat_id])
+                )
             return
 
         self.chat_data.pop(chat_id, None)
-        ChatData.objects.update_or_create(
+        self._dirty_keys.pop(chat_id, None)
+        self._new_chat_ids.discard(chat_id)
+        if self.journal is not None:
+            self.journal.append([chat_id, None])
+        await sync_to_async(ChatData.objects.update_or_create)(
             chat_id=chat_id,
-            defaults={'data': None}
+            defaults={'next_state': None, 'language': '', 'data': None}
         )
 
     @sync_to_async
     def drop_user_data(self, user_id: int) -> None:
         pass
 
-    @sync_to_async
-    def refresh_chat_data(self, chat_id: int, chat_data: CD) -> None:
-        """Do nothing.
+    async def refresh_chat_data(self, chat_id: int, chat_data: CD) -> None:
+        """Load the chat data from Database when the chat is seen for the
+        first time since the bot started.
 
         .. versionadded:: 13.6
         .. seealso:: :meth:`telegram.ext.BasePersistence.refresh_user_data`
+
+        Args:
+            chat_id (:obj:`int`): The chat ID this :attr:`chat_data` is
+                                  associated with.
+            chat_data (:obj:`dict`): The ``chat_data`` of a single chat.
         """
+        if self.chat_data.touch(chat_id):
+            return
+
+        session = await self._load_chat_data(chat_id)
+        if session is None:
+            session = ChatSession()
+            self._new_chat_ids.add(chat_id)
+        self.chat_data[chat_id] = session
+        if session and not chat_data:
+            chat_data.update(session)
+        self._evict_idle_chats(keep=(chat_id,))
+
+    def _evict_idle_chats(self, keep: Iterable[int] = ()) -> None:
+        """Evict idle chats which have already been written to Database."""
+        evicted_chat_ids = self.chat_data.evict(
+            keep=self._dirty_keys.keys() | set(keep)
+        )
+        self._new_chat_ids.difference_update(evicted_chat_ids)
+        if not evicted_chat_ids or self._application is None:
+            return
+
+        for chat_id in evicted_chat_ids:
+            self._evicted_chat_ids.add(chat_id)
+            self._application.drop_chat_data(chat_id)
+
+    @staticmethod
+    @database_sync_to_async
+    def _load_chat_data(chat_id: int) -> Optional[ChatSession]:
+        """Load the chat from ChatData or restore it from the archive."""
+        row = ChatData.objects.filter(chat_id=chat_id).values(
+            'next_state',
+            'language',
+            'data'
+        ).first()
+        if row is None:
+            row = restore_archived_chat(chat_id)
+        if row is None:
+            return None
+        return ChatSession.from_row(**row)
 
     @sync_to_async
     def refresh_bot_data(self, bot_data: BD) -> None:
@@ -139,5 +697,15 @@ class DjangoPersistence(BasePersistence):
     def refresh_user_data(self, user_id: int, user_data: UD) -> None:
         pass
 
-    def flush(self) -> None:
-        pass
+    async def flush(self) -> None:
+        """Write all the chat data waiting for the next write to Database."""
+        if self._write_task is not None:
+            self._write_task.cancel()
+            self._write_task = None
+        await self._write_dirty_chats()
+
+        if self.journal is not None:
+            async with self._write_lock:
+                self._compact_journal()
+            self.journal.close()
+            self.journal.unlock()
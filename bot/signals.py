@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .database import catalog_cache, certificate_filter
+from .models import BotData, Certificate, Faq, Impression
+
+
+@receiver(post_save, sender=BotData)
+@receiver(post_delete, sender=BotData)
+@receiver(post_save, sender=Faq)
+@receiver(post_delete, sender=Faq)
+@receiver(post_save, sender=Impression)
+@receiver(post_delete, sender=Impression)
+def invalidate_catalog(sender, using, **kwargs):
+    """Drop the cached catalog when an operator changes it, in this
+    process and, through the version stamp, in the bot process.
+
+    The catalog is dropped once the change is committed, otherwise it
+    could be loaded again without the change before the commit.
+    """
+    transaction.on_commit(drop_catalog, using=using)
+
+
+def drop_catalog():
+    catalog_cache.invalidate()
+    catalog_cache.stamp.bump()
+
+
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def invalidate_certificate_filter(sender, using, **kwargs):
+    """Drop the cached certificate ids once changed certificates are
+    committed.
+    """
+    transaction.on_commit(drop_certificate_filter, using=using)
+
+
+def drop_certificate_filter():
+    certificate_filter.invalidate()
+    certificate_filter.stamp.bump()
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection."""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
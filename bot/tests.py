@@ -1,3 +1,1478 @@
-from django.test import TestCase
+import asyncio
+import io
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from enum import IntEnum
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    Update,
+    User as TelegramUser
+)
+from telegram.ext import Application, TypeHandler
+
+from bot.archive import (
+    archive_stale_chats,
+    decompress_chat_data,
+    restore_archived_chat
+)
+from bot.certificates import (
+    CERTIFICATE_ID_MAX,
+    CERTIFICATE_ID_MIN,
+    CertificateIdGenerator,
+    issue_certificates,
+    issue_certificates_for_orders
+)
+from bot.conversation import StateMachine
+from bot.database import (
+    CertificateFilter,
+    Database,
+    VersionStamp,
+    database_sync_to_async,
+    catalog_cache,
+    certificate_filter
+)
+from bot.journal import Journal
+from bot.keyboards import KeyboardRegistry
+from bot.messages import escape_markdown, load_message_catalogs
+from bot.models import (
+    ArchivedChatData,
+    Certificate,
+    ChatData,
+    Customer,
+    Faq,
+    Impression,
+    Order,
+    SupportApplication
+)
+from bot.outbox import SupportApplicationOutbox
+from bot.persistence import ChatDataCache, ChatSession, DjangoPersistence
+from bot.updates import ChatUpdateProcessor, UpdateQueue
+from bot.webhook import TelegramWebhook
+
+
+class ChatSessionTest(SimpleTestCase):
+    """Sessions keep the state and language in columns of ChatData."""
+
+    def test_from_row_takes_columns_from_old_rows(self):
+        session = ChatSession.from_row(
+            next_state=None,
+            language='',
+            data={'next_state': 3, 'language': 'russian', 'unknown': 1}
+        )
+
+        self.assertEqual(session, {'next_state': 3, 'language': 'russian'})
+
+    def test_to_row_and_diff(self):
+        session = ChatSession({
+            'next_state': 2,
+            'language': 'english',
+            'customer_email': 'a@example.com'
+        })
+        changed_session = ChatSession(session.items())
+        changed_session['next_state'] = 3
+
+        self.assertEqual(
+            session.to_row(),
+            {
+                'next_state': 2,
+                'language': 'english',
+                'data': {'customer_email': 'a@example.com'}
+            }
+        )
+        self.assertEqual(changed_session.diff(session), {'next_state'})
+        with self.assertRaises(KeyError):
+            session['unknown'] = 1
+
+
+class ChatDataCacheTest(SimpleTestCase):
+    """The least recently used chats are evicted first."""
+
+    def test_evict_least_recently_used(self):
+        cache = ChatDataCache(max_size=2)
+        for chat_id in (1, 2, 3, 4):
+            cache[chat_id] = ChatSession()
+        cache.touch(1)
+        cache.touch(5)
+
+        self.assertEqual(cache.evict(keep=[2]), [3, 4])
+        self.assertEqual(
+            cache.stats(),
+            {'size': 2, 'hits': 1, 'misses': 1, 'evictions': 2}
+        )
+
+
+class JournalTest(SimpleTestCase):
+    """Records survive a restart and are replaced by a compaction."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'journal.jsonl'
+
+    def test_torn_record_is_skipped(self):
+        journal = Journal(self.path)
+        journal.open()
+        journal.append([1, {'next_state': 2}])
+        journal.close()
+        with open(self.path, 'a', encoding='utf-8') as log:
+            log.write('[2, {"next_st')
+
+        with self.assertLogs('bot.journal', 'WARNING'):
+            records = Journal(self.path).read()
+        self.assertEqual(records, [[1, {'next_state': 2}]])
+
+    def test_compact_replaces_records(self):
+        journal = Journal(self.path)
+        journal.open()
+        for next_state in range(3):
+            journal.append([1, {'next_state': next_state}])
+        journal.compact([[1, {'next_state': 2}]])
+        journal.append([2, None])
+        journal.close()
+
+        self.assertEqual(journal.records_count, 1)
+        self.assertEqual(
+            Journal(self.path).read(),
+            [[1, {'next_state': 2}], [2, None]]
+        )
+
+
+class DjangoPersistenceTest(TestCase):
+    """Changes of chats are written in bulk, only the changed columns."""
+
+    @staticmethod
+    def get_queries(queries, statement):
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(statement)
+        ]
+
+    def test_changes_of_chat_are_coalesced(self):
+        persistence = DjangoPersistence(write_interval=60)
+
+        async def update_chats():
+            for chat_id in (1, 2):
+                for next_state in (2, 3, 4):
+                    await persistence.update_chat_data(
+                        chat_id,
+                        ChatSession({
+                            'next_state': next_state,
+                            'language': 'english'
+                        })
+                    )
+            await persistence.flush()
+
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(update_chats)()
+
+        self.assertEqual(len(self.get_queries(queries, 'INSERT')), 1)
+        self.assertEqual(
+            list(
+                ChatData.objects.order_by('chat_id')
+                .values_list('chat_id', 'next_state')
+            ),
+            [(1, 4), (2, 4)]
+        )
+        self.assertEqual(persistence.rows_written, 2)
+
+    def test_only_changed_columns_are_written(self):
+        ChatData.objects.create(
+            chat_id=1,
+            next_state=2,
+            language='english',
+            data={'customer_email': 'a@example.com'}
+        )
+        persistence = DjangoPersistence(write_interval=60)
+
+        async def change_state():
+            session = ChatSession()
+            await persistence.refresh_chat_data(1, session)
+            session['next_state'] = 3
+            await persistence.update_chat_data(1, session)
+            await persistence.flush()
+
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(change_state)()
+
+        updates = self.get_queries(queries, 'UPDATE')
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"next_state"', updates[0])
+        self.assertNotIn('"data"', updates[0])
+        chat = ChatData.objects.get(chat_id=1)
+        self.assertEqual(chat.next_state, 3)
+        self.assertEqual(chat.data, {'customer_email': 'a@example.com'})
+
+    def test_chat_back_before_eviction_drop_is_written(self):
+        dropped_chat_ids = []
+        application = SimpleNamespace(
+            chat_data={},
+            drop_chat_data=dropped_chat_ids.append
+        )
+        persistence = DjangoPersistence(write_interval=60, cache_size=1)
+        persistence.set_application(application)
+
+        async def evict_and_come_back():
+            await persistence.refresh_chat_data(1, ChatSession())
+            await persistence.refresh_chat_data(2, ChatSession())
+            application.chat_data[1] = ChatSession({
+                'next_state': 5,
+                'language': 'english'
+            })
+            await persistence.refresh_chat_data(1, ChatSession())
+            # The application drops the evicted chat on its next
+            # persistence update, without passing its changes.
+            await persistence.drop_chat_data(1)
+            await persistence.flush()
+
+        async_to_sync(evict_and_come_back)()
+
+        self.assertEqual(dropped_chat_ids, [1, 2])
+        self.assertEqual(ChatData.objects.get(chat_id=1).next_state, 5)
+
+    def test_chat_archived_while_cached_is_inserted_again(self):
+        persistence = DjangoPersistence(write_interval=60)
+
+        async def load_chat():
+            await persistence.refresh_chat_data(1, ChatSession())
+
+        async def change_state():
+            await persistence.update_chat_data(
+                1,
+                ChatSession({'next_state': 3, 'language': 'english'})
+            )
+            await persistence.flush()
+
+        ChatData.objects.create(chat_id=1, next_state=2, language='english')
+        async_to_sync(load_chat)()
+        ChatData.objects.update(called_at=timezone.now() - timedelta(days=1))
+        archive_stale_chats(idle_days=0)
+        async_to_sync(change_state)()
+
+        self.assertEqual(ChatData.objects.get(chat_id=1).next_state, 3)
+        self.assertFalse(ArchivedChatData.objects.exists())
+
+    def test_unwritten_changes_are_restored_from_journal(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        journal_path = str(Path(directory.name) / 'chat_data.jsonl')
+
+        async def stop_before_write():
+            persistence = DjangoPersistence(write_interval=60)
+            await persistence.get_chat_data()
+            await persistence.update_chat_data(
+                1,
+                ChatSession({'next_state': 2, 'language': 'english'})
+            )
+            persistence._write_task.cancel()
+            persistence.journal.close()
+            persistence.journal.unlock()
+
+        async def restart():
+            persistence = DjangoPersistence(write_interval=60)
+            restored_chat_data = await persistence.get_chat_data()
+            await persistence.flush()
+            return restored_chat_data
+
+        with override_settings(CHAT_DATA_JOURNAL_PATH=journal_path):
+            async_to_sync(stop_before_write)()
+            self.assertFalse(ChatData.objects.exists())
+            restored_chat_data = async_to_sync(restart)()
+
+        self.assertEqual(
+            restored_chat_data,
+            {1: {'next_state': 2, 'language': 'english'}}
+        )
+        self.assertEqual(ChatData.objects.get(chat_id=1).next_state, 2)
+        self.assertEqual(Journal(journal_path).read(), [])
+
+    def test_written_changes_are_not_restored_from_journal(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        journal_path = str(Path(directory.name) / 'chat_data.jsonl')
+
+        async def stop_after_write():
+            persistence = DjangoPersistence(write_interval=60)
+            await persistence.get_chat_data()
+            for chat_id in (1, 2):
+                await persistence.update_chat_data(
+                    chat_id,
+                    ChatSession({'next_state': 2, 'language': 'english'})
+                )
+            await persistence._write_dirty_chats()
+            await persistence.update_chat_data(
+                2,
+                ChatSession({'next_state': 3, 'language': 'english'})
+            )
+            persistence._write_task.cancel()
+            persistence.journal.close()
+            persistence.journal.unlock()
+
+        async def restart():
+            persistence = DjangoPersistence(write_interval=60)
+            restored_chat_data = await persistence.get_chat_data()
+            persistence._write_task.cancel()
+            persistence.journal.close()
+            persistence.journal.unlock()
+            return restored_chat_data
+
+        with override_settings(CHAT_DATA_JOURNAL_PATH=journal_path):
+            async_to_sync(stop_after_write)()
+            archive_stale_chats(idle_days=-1)
+            restored_chat_data = async_to_sync(restart)()
+
+        self.assertEqual(
+            restored_chat_data,
+            {2: {'next_state': 3, 'language': 'english'}}
+        )
+
+    def test_journal_taken_by_another_process(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        journal_path = str(Path(directory.name) / 'chat_data.jsonl')
+        journal = Journal(journal_path)
+        self.assertTrue(journal.lock())
+        self.addCleanup(journal.unlock)
+
+        with override_settings(CHAT_DATA_JOURNAL_PATH=journal_path):
+            persistence = DjangoPersistence()
+            with self.assertRaisesMessage(RuntimeError, 'another process'):
+                async_to_sync(persistence.get_chat_data)()
+
+
+class ChatArchiveTest(TestCase):
+    """Idle chats are moved to the archive and back in batches."""
+
+    def setUp(self):
+        for chat_id in range(5):
+            ChatData.objects.create(
+                chat_id=chat_id,
+                next_state=2,
+                language='english',
+                data={'customer_email': f'{chat_id}@example.com'}
+            )
+        ChatData.objects.filter(chat_id__lt=3).update(
+            called_at=timezone.now() - timedelta(days=31)
+        )
+
+    def test_archive_stale_chats(self):
+        with CaptureQueriesContext(connection) as queries:
+            archived_count = archive_stale_chats(idle_days=30, batch_size=2)
+
+        self.assertEqual(archived_count, 3)
+        self.assertEqual(
+            sorted(ChatData.objects.values_list('chat_id', flat=True)),
+            [3, 4]
+        )
+        self.assertEqual(
+            len([
+                query for query in queries.captured_queries
+                if query['sql'].startswith('DELETE')
+            ]),
+            2
+        )
+        archived_chat = ArchivedChatData.objects.get(chat_id=1)
+        self.assertEqual(
+            decompress_chat_data(archived_chat.payload),
+            {
+                'next_state': 2,
+                'language': 'english',
+                'data': {'customer_email': '1@example.com'}
+            }
+        )
+
+    def test_chat_active_since_selected_is_not_archived(self):
+        delete = QuerySet.delete
+
+        def touch_and_delete(queryset):
+            ChatData.objects.filter(chat_id=1).update(called_at=timezone.now())
+            return delete(queryset)
+
+        with mock.patch.object(
+            QuerySet,
+            'delete',
+            autospec=True,
+            side_effect=touch_and_delete
+        ):
+            archived_count = archive_stale_chats(idle_days=30)
+
+        self.assertEqual(archived_count, 2)
+        self.assertTrue(ChatData.objects.filter(chat_id=1).exists())
+        self.assertEqual(
+            sorted(ArchivedChatData.objects.values_list('chat_id', flat=True)),
+            [0, 2]
+        )
+
+    def test_restore_archived_chat(self):
+        start_at = ChatData.objects.get(chat_id=1).start_at
+        archive_stale_chats(idle_days=30)
+
+        row = restore_archived_chat(1)
+
+        self.assertEqual(row['data'], {'customer_email': '1@example.com'})
+        self.assertEqual(ChatData.objects.get(chat_id=1).start_at, start_at)
+        self.assertFalse(ArchivedChatData.objects.filter(chat_id=1).exists())
+        self.assertIsNone(restore_archived_chat(4))
+
+
+class CatalogVersionTest(TestCase):
+    """The cached catalog is dropped once the change is committed."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'catalog.version'
+
+    def test_concurrent_bumps(self):
+        stamps = [VersionStamp(self.path, 0) for _ in range(4)]
+        errors = []
+
+        def bump(stamp):
+            try:
+                for _ in range(200):
+                    stamp.bump()
+            except OSError as error:
+                errors.append(error)
+
+        threads = [
+            threading.Thread(target=bump, args=(stamp,))
+            for stamp in stamps
+        ]
+        with self.assertNoLogs('bot.database', 'ERROR'):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            [path.name for path in self.path.parent.iterdir()],
+            ['catalog.version']
+        )
+        self.assertIn(
+            self.path.read_text(),
+            [stamp._version for stamp in stamps]
+        )
+
+    def test_failed_bump_is_logged(self):
+        stamp = VersionStamp(self.path / 'missing' / 'catalog.version', 0)
+
+        with self.assertLogs('bot.database', 'ERROR'):
+            stamp.bump()
+
+    def test_catalog_is_dropped_on_commit(self):
+        self.addCleanup(catalog_cache.invalidate)
+        catalog_cache.get('english')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Faq.objects.create(
+                number=1,
+                russian_question='Вопрос',
+                russian_answer='Ответ',
+                english_question='Question',
+                english_answer='Answer'
+            )
+            self.assertIsNotNone(catalog_cache.peek('english'))
+
+        self.assertIsNone(catalog_cache.peek('english'))
+        self.assertEqual(
+            catalog_cache.get('english')['faq_questions'][0]['question'],
+            'Question'
+        )
+
+
+class CatalogLanguageTest(TestCase):
+    """The catalog has a snapshot for every language of the bot."""
+
+    @override_settings(
+        BOT_LANGUAGES=['russian', 'english', 'german'],
+        BOT_DEFAULT_LANGUAGE='russian'
+    )
+    def test_languages_of_bot(self):
+        self.addCleanup(catalog_cache.invalidate)
+        catalog_cache.invalidate()
+        Impression.objects.create(
+            number=1,
+            name='Впечатление',
+            english_name='Impression',
+            price_in_rubles=1000,
+            price_in_euros=10
+        )
+
+        def get_name(language):
+            return catalog_cache.get(language)['impressions'][0]['name']
+
+        self.assertEqual(get_name('english'), 'Impression')
+        self.assertEqual(get_name('german'), 'Impression')
+        self.assertEqual(get_name('french'), 'Впечатление')
+
+
+class OrderCreationTest(TestCase):
+    """An order is created in one transaction without extra statements."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.impression = Impression.objects.create(
+            number=1,
+            name='Впечатление',
+            english_name='Impression',
+            price_in_rubles=1000,
+            price_in_euros=10
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media_root = Path(directory.name)
+        media_settings = override_settings(MEDIA_ROOT=directory.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def create_order(self, impression_id, customer_fullname='Customer'):
+        async_to_sync(Database().create_order)(
+            chat_id=1,
+            tg_username='customer',
+            language='english',
+            customer_email='customer@example.com',
+            customer_fullname=customer_fullname,
+            customer_phone='+79990000000',
+            impression_id=impression_id,
+            recipient_fullname='Recipient',
+            recipient_contact='Contact',
+            email_receiving=False,
+            delivery_method='self_delivery',
+            screenshot_stream=io.BytesIO(b'screenshot')
+        )
+
+    def test_create_order(self):
+        self.create_order(self.impression.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.create_order(self.impression.pk, customer_fullname='New')
+
+        statements = [
+            query['sql'].split()[0]
+            for query in queries.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        self.assertEqual(statements, ['INSERT', 'INSERT', 'INSERT'])
+        order = Order.objects.latest('pk')
+        self.assertEqual(order.customer.fullname, 'New')
+        self.assertEqual(order.delivery_method, Order.SELF_DELIVERY)
+        self.assertEqual(order.language, Order.ENGLISH_LANGUAGE)
+        self.assertEqual(order.payment_screenshot.read(), b'screenshot')
+        self.assertEqual(
+            SupportApplication.objects.filter(order=order).get().request_type,
+            SupportApplication.GIFTBOX_ORDER
+        )
+
+    def test_screenshot_is_deleted_if_order_fails(self):
+        with self.assertRaises(ValueError):
+            self.create_order('unknown')
+
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Customer.objects.exists())
+        self.assertEqual(list(self.media_root.rglob('*.jpg')), [])
+
+
+class CertificateActivationTest(TestCase):
+    """A certificate is activated by one conditional UPDATE, only once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.impression = Impression.objects.create(
+            number=1,
+            name='Впечатление',
+            english_name='Impression',
+            price_in_rubles=1000,
+            price_in_euros=10
+        )
+        cls.certificate = Certificate.objects.create(
+            certificate_id=12345678,
+            start_date=date.today() - timedelta(days=1),
+            expiry_date=date.today() + timedelta(days=1),
+            impression=cls.impression
+        )
+
+    def setUp(self):
+        certificate_filter.invalidate()
+        self.addCleanup(certificate_filter.invalidate)
+
+    def activate(self, *certificate_ids):
+        database = Database()
+
+        async def activate_all():
+            return await asyncio.gather(*(
+                database.activate_certificate(
+                    chat_id=1,
+                    tg_username='customer',
+                    language='english',
+                    certificate_id=certificate_id
+                )
+                for certificate_id in certificate_ids
+            ))
+
+        return async_to_sync(activate_all)()
+
+    def test_certificate_is_activated_once(self):
+        results = self.activate(12345678, 12345678)
+
+        self.assertEqual(
+            results,
+            [
+                {'availability': True, 'impression_name': 'Impression'},
+                {'availability': False}
+            ]
+        )
+        self.certificate.refresh_from_db()
+        self.assertIsNotNone(self.certificate.activated_at)
+        self.assertEqual(
+            SupportApplication.objects.get().request_type,
+            SupportApplication.SUCCESSFUL_ACTIVATION
+        )
+
+    def test_unavailable_certificates(self):
+        Certificate.objects.filter(pk=self.certificate.pk).update(blocked=True)
+        Certificate.objects.create(
+            certificate_id=87654321,
+            start_date=date.today() - timedelta(days=2),
+            expiry_date=date.today() - timedelta(days=1),
+            impression=self.impression
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self.activate(12345678, 87654321)
+
+        self.assertEqual(results, [{'availability': False}] * 2)
+        self.assertEqual(
+            [
+                query['sql'].split()[0]
+                for query in queries.captured_queries
+            ].count('UPDATE'),
+            2
+        )
+        self.assertFalse(SupportApplication.objects.exists())
+
+
+class DatabaseExecutorTest(SimpleTestCase):
+    @staticmethod
+    def get_thread_name():
+        return threading.current_thread().name
+
+    def test_functions_run_in_shared_thread_without_executor(self):
+        with mock.patch('bot.database.database_executor', None):
+            get_thread_name = database_sync_to_async(self.get_thread_name)
+
+        self.assertEqual(
+            async_to_sync(get_thread_name)(),
+            threading.current_thread().name
+        )
+
+    def test_functions_run_in_executor(self):
+        executor = ThreadPoolExecutor(
+            max_workers=2,
+            thread_name_prefix='database'
+        )
+        self.addCleanup(executor.shutdown)
+        with mock.patch('bot.database.database_executor', executor):
+            get_thread_name = database_sync_to_async(self.get_thread_name)
+
+        async def get_thread_names():
+            return await asyncio.gather(
+                *(get_thread_name() for _ in range(4))
+            )
+
+        for thread_name in async_to_sync(get_thread_names)():
+            self.assertTrue(thread_name.startswith('database_'))
+
+
+class SqlitePragmaTest(TestCase):
+    def get_cache_size(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            return cursor.fetchone()[0]
+
+    def set_cache_size(self, cache_size):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA cache_size = {cache_size}')
+
+    def send_connection_created(self):
+        connection_created.send(
+            sender=type(connection),
+            connection=connection
+        )
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        self.addCleanup(self.set_cache_size, self.get_cache_size())
+
+        with override_settings(SQLITE_PRAGMAS={'cache_size': -4321}):
+            self.send_connection_created()
+
+        self.assertEqual(self.get_cache_size(), -4321)
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_nothing_is_applied_without_pragmas(self):
+        with CaptureQueriesContext(connection) as context:
+            self.send_connection_created()
+
+        self.assertEqual(context.captured_queries, [])
+
+
+class CertificateIssueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.impression = Impression.objects.create(
+            number=1,
+            name='Впечатление',
+            english_name='Impression',
+            price_in_rubles=1000,
+            price_in_euros=10
+        )
+        cls.customer = Customer.objects.create(
+            chat_id=1,
+            tg_username='customer',
+            fullname='Customer'
+        )
+
+    def create_order(self, confirmed=True):
+        return Order.objects.create(
+            impression=self.impression,
+            customer=self.customer,
+            recipient_fullname='Recipient',
+            recipient_contact='Contact',
+            receiving_method=Order.EMAIL,
+            confirmed=confirmed
+        )
+
+    @mock.patch('bot.certificates.CERTIFICATE_ID_MAX', CERTIFICATE_ID_MIN + 2)
+    def test_generator_skips_taken_ids(self):
+        certificate_ids = CertificateIdGenerator(
+            [CERTIFICATE_ID_MIN, CERTIFICATE_ID_MIN + 2]
+        )
+
+        self.assertEqual(next(certificate_ids), CERTIFICATE_ID_MIN + 1)
+        with self.assertRaises(ValueError):
+            next(certificate_ids)
+
+    def test_generator_does_not_repeat_ids(self):
+        certificate_ids = CertificateIdGenerator([])
+        generated_ids = [next(certificate_ids) for _ in range(1000)]
+
+        self.assertEqual(len(set(generated_ids)), len(generated_ids))
+        for certificate_id in generated_ids:
+            self.assertGreaterEqual(certificate_id, CERTIFICATE_ID_MIN)
+            self.assertLessEqual(certificate_id, CERTIFICATE_ID_MAX)
+
+    def test_certificates_are_inserted_in_batches(self):
+        with CaptureQueriesContext(connection) as context:
+            certificates = issue_certificates(
+                self.impression,
+                5,
+                start_date=date.today(),
+                expiry_date=date.today(),
+                batch_size=2
+            )
+
+        inserts = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('INSERT')
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(
+            sorted(
+                Certificate.objects.values_list('certificate_id', flat=True)
+            ),
+            sorted(certificate.certificate_id for certificate in certificates)
+        )
+
+    def test_orders_with_certificates_are_skipped(self):
+        first_order = self.create_order()
+        second_order = self.create_order()
+        issue_certificates_for_orders(
+            Order.objects.filter(pk=first_order.pk),
+            start_date=date.today(),
+            expiry_date=date.today()
+        )
+
+        certificates = issue_certificates_for_orders(
+            Order.objects.all(),
+            start_date=date.today(),
+            expiry_date=date.today()
+        )
+
+        self.assertEqual(
+            [certificate.order for certificate in certificates],
+            [second_order]
+        )
+        self.assertEqual(Certificate.objects.count(), 2)
+
+    def test_command_issues_certificates_for_confirmed_orders(self):
+        order = self.create_order()
+        self.create_order(confirmed=False)
+        stdout = io.StringIO()
+
+        call_command(
+            'issue_certificates',
+            '--start-date=2024-01-01',
+            '--valid-days=10',
+            stdout=stdout,
+            stderr=io.StringIO()
+        )
+
+        certificate = Certificate.objects.get()
+        self.assertEqual(certificate.order, order)
+        self.assertEqual(certificate.expiry_date, date(2024, 1, 11))
+        self.assertEqual(
+            stdout.getvalue(), f'{certificate.certificate_id}\n'
+        )
+
+    def test_command_issues_certificates_for_impression(self):
+        call_command(
+            'issue_certificates',
+            '--impression=1',
+            '--count=3',
+            stdout=io.StringIO(),
+            stderr=io.StringIO()
+        )
+
+        self.assertEqual(
+            Certificate.objects.filter(
+                impression=self.impression, order=None
+            ).count(),
+            3
+        )
+
+
+class CertificateFilterTest(TestCase):
+    """Codes of certificates issued after the filter was loaded are not
+    rejected for long.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.impression = Impression.objects.create(
+            number=1,
+            name='Впечатление',
+            english_name='Impression',
+            price_in_rubles=1000,
+            price_in_euros=10
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.version_path = Path(directory.name) / 'certificates.version'
+
+    def create_certificate(self, certificate_id):
+        return Certificate.objects.create(
+            certificate_id=certificate_id,
+            start_date=date.today(),
+            expiry_date=date.today(),
+            impression=self.impression
+        )
+
+    def test_filter_is_dropped_on_commit(self):
+        self.addCleanup(certificate_filter.invalidate)
+        self.assertNotIn('12345678', certificate_filter)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_certificate(12345678)
+            self.assertIsNotNone(certificate_filter._certificate_ids)
+
+        self.assertIsNone(certificate_filter._certificate_ids)
+        self.assertIn('12345678', certificate_filter)
+
+    def test_missing_code_is_looked_up_in_reloaded_ids(self):
+        fresh_filter = CertificateFilter(VersionStamp(self.version_path, 60))
+        stale_filter = CertificateFilter(VersionStamp(self.version_path, 0))
+        self.assertNotIn('12345678', fresh_filter)
+        self.assertNotIn('12345678', stale_filter)
+
+        Certificate.objects.bulk_create([
+            Certificate(
+                certificate_id=12345678,
+                start_date=date.today(),
+                expiry_date=date.today(),
+                impression=self.impression
+            )
+        ])
+
+        with self.assertNumQueries(0):
+            self.assertNotIn('12345678', fresh_filter)
+        self.assertIn('12345678', stale_filter)
+        self.assertEqual(stale_filter.stats(), {'rejected': 1, 'forwarded': 1})
+
+    def test_codes_are_read_like_int(self):
+        self.create_certificate(12345678)
+        certificate_filter = CertificateFilter(
+            VersionStamp(self.version_path, 60)
+        )
+
+        self.assertIn(' 12345678 ', certificate_filter)
+        self.assertIn('+12345678', certificate_filter)
+        with self.assertNumQueries(0):
+            self.assertNotIn('-1', certificate_filter)
+            self.assertNotIn('1' * 30, certificate_filter)
+            self.assertNotIn('2147483648', certificate_filter)
+            self.assertNotIn('1 2', certificate_filter)
+
+
+class SupportApplicationOutboxTest(TestCase):
+    """Queued applications are inserted in bulk and survive a restart."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'support_applications.jsonl'
+
+    def open_outbox(self):
+        outbox = SupportApplicationOutbox(self.path)
+        outbox.open()
+        self.addCleanup(outbox.close)
+        return outbox
+
+    @staticmethod
+    def put(outbox, chat_id):
+        outbox.put(
+            chat_id=chat_id,
+            tg_username='customer',
+            language=SupportApplication.ENGLISH_LANGUAGE,
+            request_type=SupportApplication.QUESTION_FOR_OPERATOR
+        )
+
+    def test_put_and_drain(self):
+        outbox = self.open_outbox()
+        self.put(outbox, 1)
+        self.put(outbox, 2)
+        self.assertFalse(SupportApplication.objects.exists())
+
+        self.assertEqual(outbox.drain(), 2)
+        self.assertEqual(SupportApplication.objects.count(), 2)
+        self.assertEqual(outbox.journal.read(), [])
+
+    def test_queued_applications_are_read_on_open(self):
+        outbox = self.open_outbox()
+        self.put(outbox, 1)
+        outbox.close()
+
+        self.assertEqual(self.open_outbox().drain(), 1)
+        self.assertEqual(SupportApplication.objects.get().chat_id, 1)
+
+    def test_failed_insert_keeps_applications(self):
+        outbox = self.open_outbox()
+        self.put(outbox, 1)
+
+        with mock.patch.object(
+            SupportApplication.objects,
+            'bulk_create',
+            side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                outbox.drain()
+        self.put(outbox, 2)
+
+        self.assertEqual(outbox.drain(), 2)
+        self.assertEqual(
+            sorted(
+                SupportApplication.objects.values_list('chat_id', flat=True)
+            ),
+            [1, 2]
+        )
+
+    def test_outbox_taken_by_another_process(self):
+        outbox = self.open_outbox()
+        self.put(outbox, 1)
+
+        with self.assertLogs('bot.outbox', 'WARNING'):
+            other_outbox = self.open_outbox()
+        self.put(other_outbox, 2)
+
+        self.assertFalse(other_outbox.is_open)
+        self.assertEqual(other_outbox.drain(), 0)
+        self.assertEqual(SupportApplication.objects.get().chat_id, 2)
+        self.assertEqual(outbox.drain(), 1)
+
+
+class AdminQueryPlanTest(TestCase):
+    """The changelist queries of the admin use the indexes of the models."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_open_applications_by_date(self):
+        self.assertUsesIndex(
+            SupportApplication.objects.filter(closed=False),
+            'open_application_idx'
+        )
+
+    def test_applications_of_request_type_by_date(self):
+        self.assertUsesIndex(
+            SupportApplication.objects.filter(
+                request_type=SupportApplication.QUESTION_FOR_OPERATOR
+            ),
+            'application_type_idx'
+        )
+
+    def test_applications_by_date(self):
+        self.assertUsesIndex(
+            SupportApplication.objects.all()[:100],
+            'application_registered_idx'
+        )
+
+    def test_unconfirmed_orders(self):
+        self.assertUsesIndex(
+            Order.objects.filter(confirmed=False),
+            'unconfirmed_order_idx'
+        )
+
+    def test_undelivered_orders(self):
+        self.assertUsesIndex(
+            Order.objects.filter(confirmed=True, delivered=False),
+            'undelivered_order_idx'
+        )
+
+    def test_certificates_by_expiry_date(self):
+        self.assertUsesIndex(
+            Certificate.objects.all()[:100],
+            'certificate_expiry_idx'
+        )
+
+
+class AdminQueryCountTest(TestCase):
+    """The number of queries of an admin page does not grow with data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', '', 'password')
+        cls.impression = Impression.objects.create(
+            number=1,
+            name='Впечатление',
+            english_name='Impression',
+            price_in_rubles=1000,
+            price_in_euros=10
+        )
+        cls.customer = Customer.objects.create(
+            chat_id=1,
+            tg_username='customer',
+            fullname='Customer'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_orders(self, count):
+        orders = Order.objects.bulk_create(
+            Order(
+                impression=self.impression,
+                customer=self.customer,
+                recipient_fullname='Recipient',
+                recipient_contact='Contact',
+                receiving_method=Order.EMAIL
+            )
+            for _ in range(count)
+        )
+        Certificate.objects.bulk_create(
+            Certificate(
+                certificate_id=order.pk,
+                start_date=date.today(),
+                expiry_date=date.today(),
+                impression=self.impression,
+                order=order
+            )
+            for order in orders
+        )
+        SupportApplication.objects.bulk_create(
+            SupportApplication(
+                chat_id=self.customer.chat_id,
+                tg_username='customer',
+                request_type=SupportApplication.EMAIL_ORDER,
+                order=order
+            )
+            for order in orders
+        )
+        return orders
+
+    def count_queries(self, url):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertQueriesDoNotGrow(self, get_url):
+        self.create_orders(1)
+        few_orders_queries = self.count_queries(get_url())
+        self.create_orders(100)
+        many_orders_queries = self.count_queries(get_url())
+        self.assertEqual(few_orders_queries, many_orders_queries)
+
+    def test_customer_change_page(self):
+        self.assertQueriesDoNotGrow(
+            lambda: reverse(
+                'admin:bot_customer_change',
+                args=(self.customer.pk,)
+            )
+        )
+
+    def test_order_change_page(self):
+        self.assertQueriesDoNotGrow(
+            lambda: reverse(
+                'admin:bot_order_change',
+                args=(Order.objects.first().pk,)
+            )
+        )
+
+    def test_changelists(self):
+        for model_name in ('order', 'certificate', 'supportapplication'):
+            with self.subTest(model_name):
+                self.assertQueriesDoNotGrow(
+                    lambda: reverse(f'admin:bot_{model_name}_changelist')
+                )
+
+
+class TelegramWebhookTest(SimpleTestCase):
+    """Only updates with the secret token and of limited size are queued."""
+
+    def setUp(self):
+        self.bot_application = SimpleNamespace(
+            bot=None,
+            update_queue=asyncio.Queue()
+        )
+        self.webhook = TelegramWebhook(
+            site=None,
+            bot_application=self.bot_application,
+            path='/telegram/',
+            webhook_url='https://example.com/telegram/',
+            secret_token='secret',
+            max_body_size=1000
+        )
+
+    def post(self, chunks, headers=()):
+        messages = [
+            {'type': 'http.request', 'body': chunk, 'more_body': True}
+            for chunk in chunks
+        ]
+        messages[-1]['more_body'] = False
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': 'POST',
+            'path': '/telegram/',
+            'headers': list(headers)
+        }
+        asyncio.run(self.webhook(scope, receive, send))
+        return sent[0]['status']
+
+    def test_update_is_queued(self):
+        body = b'{"update_id": 1}'
+        status = self.post(
+            [body],
+            [(b'x-telegram-bot-api-secret-token', b'secret')]
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(self.bot_application.update_queue.qsize(), 1)
+
+    def test_wrong_secret_token(self):
+        self.assertEqual(self.post([b'{"update_id": 1}']), 403)
+        self.assertEqual(
+            self.post(
+                [b'{"update_id": 1}'],
+                [(b'x-telegram-bot-api-secret-token', b'wrong')]
+            ),
+            403
+        )
+        self.assertTrue(self.bot_application.update_queue.empty())
+
+    def test_large_body(self):
+        secret_header = (b'x-telegram-bot-api-secret-token', b'secret')
+
+        self.assertEqual(
+            self.post([b'{}'], [secret_header, (b'content-length', b'1001')]),
+            413
+        )
+        self.assertEqual(self.post([b' ' * 600] * 2, [secret_header]), 413)
+        self.assertTrue(self.bot_application.update_queue.empty())
+
+    def test_stop_bot_calls_post_stop_and_post_shutdown(self):
+        calls = []
+
+        def record(name):
+            async def call(*args):
+                calls.append(name)
+            return call
+
+        self.webhook.bot_application = SimpleNamespace(
+            running=True,
+            stop=record('stop'),
+            post_stop=record('post_stop'),
+            shutdown=record('shutdown'),
+            post_shutdown=record('post_shutdown')
+        )
+        asyncio.run(self.webhook.stop_bot())
+
+        self.assertEqual(
+            calls,
+            ['stop', 'post_stop', 'shutdown', 'post_shutdown']
+        )
+
+
+class ChatUpdateProcessorTest(SimpleTestCase):
+    """Chats are handled concurrently, updates of a chat in order."""
+
+    @staticmethod
+    def make_update(update_id, chat_id):
+        return Update.de_json(
+            {
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id,
+                    'date': 0,
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'text': 'text'
+                }
+            },
+            None
+        )
+
+    def process(self, processor, updates):
+        handled = []
+        running = []
+        running_peak = []
+
+        async def handle(update):
+            running.append(update.update_id)
+            running_peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(update.update_id)
+            handled.append((update.effective_chat.id, update.update_id))
+
+        async def process_all():
+            await asyncio.gather(*(
+                processor.process_update(update, handle(update))
+                for update in updates
+            ))
+
+        asyncio.run(process_all())
+        return handled, max(running_peak)
+
+    def test_updates_of_chat_are_handled_in_order(self):
+        updates = [
+            self.make_update(update_id, chat_id=update_id % 3)
+            for update_id in range(30)
+        ]
+        handled, _ = self.process(ChatUpdateProcessor(8, 100), updates)
+
+        for chat_id in range(3):
+            self.assertEqual(
+                [update_id for chat, update_id in handled if chat == chat_id],
+                list(range(chat_id, 30, 3))
+            )
+
+    def test_chats_are_handled_concurrently_up_to_limit(self):
+        updates = [
+            self.make_update(update_id, chat_id=update_id)
+            for update_id in range(20)
+        ]
+        processor = ChatUpdateProcessor(4, 100)
+        _, running_peak = self.process(processor, updates)
+
+        self.assertEqual(running_peak, 4)
+        self.assertFalse(processor._chat_locks)
+
+    def test_waiting_chat_does_not_take_slot(self):
+        updates = [self.make_update(update_id, 1) for update_id in range(10)]
+        updates.append(self.make_update(10, chat_id=2))
+        handled, _ = self.process(ChatUpdateProcessor(2, 100), updates)
+
+        self.assertEqual(handled[1], (2, 10))
+
+    def test_full_processor_holds_back_update_queue(self):
+        update_queue = UpdateQueue(2, max_taken_updates=2)
+        application = (
+            Application.builder()
+            .token('1:token')
+            .update_queue(update_queue)
+            .concurrent_updates(ChatUpdateProcessor(1, 1))
+            .job_queue(None)
+            .build()
+        )
+        application.bot._bot_user = TelegramUser(1, 'bot', is_bot=True)
+        application.bot._initialized = True
+        handled = []
+
+        async def run():
+            release = asyncio.Event()
+
+            async def handle(update, context):
+                await release.wait()
+                handled.append(update)
+
+            application.add_handler(TypeHandler(int, handle))
+            await application.initialize()
+            await application.start()
+            try:
+                for update in range(4):
+                    await asyncio.wait_for(update_queue.put(update), 1)
+                    await asyncio.sleep(0.01)
+                return update_queue.qsize(), update_queue.full()
+            finally:
+                release.set()
+                await update_queue.join()
+                await application.stop()
+                await application.shutdown()
+
+        self.assertEqual(asyncio.run(run()), (2, True))
+        self.assertEqual(sorted(handled), [0, 1, 2, 3])
+
+
+class StateMachineTest(SimpleTestCase):
+    """The transition table is checked when the machine is built."""
+
+    State = IntEnum('State', 'START MENU ANSWER')
+
+    @staticmethod
+    def make_handler(next_state):
+        async def handle(update):
+            return next_state
+        return handle
+
+    def test_missing_handler(self):
+        with self.assertRaisesMessage(ValueError, 'ANSWER'):
+            StateMachine(
+                self.State,
+                initial_state=self.State.START,
+                transitions={
+                    self.State.START: (self.make_handler(2), [2]),
+                    self.State.MENU: (self.make_handler(1), [1]),
+                }
+            )
+
+    def test_unreachable_state(self):
+        with self.assertRaisesMessage(ValueError, 'ANSWER'):
+            StateMachine(
+                self.State,
+                initial_state=self.State.START,
+                transitions={
+                    self.State.START: (self.make_handler(2), [2]),
+                    self.State.MENU: (self.make_handler(1), [1]),
+                    self.State.ANSWER: (self.make_handler(2), [2]),
+                }
+            )
+
+    def test_handle(self):
+        machine = StateMachine(
+            self.State,
+            initial_state=self.State.START,
+            transitions={
+                self.State.START: (self.make_handler(2), [2]),
+                self.State.MENU: (self.make_handler(3), [3]),
+                self.State.ANSWER: (self.make_handler(0), []),
+            }
+        )
+
+        states = [1]
+        for _ in range(4):
+            states.append(asyncio.run(machine.handle(states[-1], None)))
+
+        self.assertEqual(states, [1, 2, 3, 1, 2])
+        self.assertEqual(machine.stats()['START']['entries'], 2)
+        self.assertEqual(machine.stats()['ANSWER']['entries'], 1)
+        self.assertEqual(machine.unexpected_transitions, 0)
+
+
+class MessageCatalogTest(SimpleTestCase):
+    """Messages are escaped for MarkdownV2 like the rest of the bot."""
+
+    def test_escape_markdown(self):
+        self.assertEqual(
+            escape_markdown('*Bali* (1-2 days). Price: 10!'),
+            '*Bali* \\(1\\-2 days\\)\\. Price: 10\\!'
+        )
+        self.assertEqual(escape_markdown('3\\.5 or 4.5'), '3\\.5 or 4\\.5')
+
+    def test_markdown_escapes_static_text_and_fields(self):
+        messages = load_message_catalogs(['russian'])['russian']
+
+        self.assertEqual(
+            messages.markdown('good_certificate', impression_name='Bali.'),
+            'Твое впечатление это \\-\n*Bali\\.*\nПрекрасный выбор\\!\n\n'
+            'В течение часа с тобой свяжется оператор\n'
+            'и расскажет все детали\\.\nДо скорых встреч ✋'
+        )
+        self.assertEqual(
+            messages.text(
+                'self_delivery_menu',
+                address='A.',
+                opening_hours='B'
+            ),
+            'Самовывоз доступен по адресу:\nA.\n\nЧасы работы:\nB'
+        )
+
+    def test_catalogs_have_same_messages(self):
+        catalogs = load_message_catalogs(['russian', 'english'])
+
+        self.assertEqual(list(catalogs), ['russian', 'english'])
+
+
+class KeyboardRegistryTest(SimpleTestCase):
+    def test_keyboard_is_made_once_per_language(self):
+        catalogs = load_message_catalogs(['russian', 'english'])
+        keyboards = KeyboardRegistry(
+            {
+                'faq': [[
+                    ('faq_button', 'faq'),
+                    ('back_to_main_menu_button', 'back')
+                ]]
+            },
+            catalogs
+        )
+
+        russian_keyboard = keyboards.get('faq', catalogs['russian'])
+        self.assertIs(
+            keyboards.get('faq', catalogs['russian']),
+            russian_keyboard
+        )
+        self.assertIsNot(
+            keyboards.get('faq', catalogs['english']),
+            russian_keyboard
+        )
+
+        payload = russian_keyboard.to_dict()
+        self.assertIs(russian_keyboard.to_dict(), payload)
+        self.assertEqual(
+            payload,
+            InlineKeyboardMarkup([[
+                InlineKeyboardButton(
+                    catalogs['russian']['faq_button'],
+                    callback_data='faq'
+                ),
+                InlineKeyboardButton(
+                    catalogs['russian']['back_to_main_menu_button'],
+                    callback_data='back'
+                )
+            ]]).to_dict()
+        )
@@ -0,0 +1,110 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """Process updates of different chats concurrently and updates of one
+    chat one after another in the order they arrived.
+
+    A handler reads the state of the chat left by the previous update, so
+    the next update of the chat waits until the previous one is handled.
+    An update waiting for its chat does not count towards
+    ``max_handled_updates``, which limits only the updates being handled,
+    so a chat flooding the bot does not hold back other chats. The base
+    limit ``max_concurrent_updates`` counts the waiting updates as well.
+    """
+    __slots__ = ('max_handled_updates', '_chat_locks', '_handling_semaphore')
+
+    def __init__(self, max_handled_updates: int, max_waiting_updates: int):
+        super().__init__(max_handled_updates + max_waiting_updates)
+        self.max_handled_updates = max_handled_updates
+        self._handling_semaphore = asyncio.BoundedSemaphore(
+            max_handled_updates
+        )
+        self._chat_locks: Dict[Hashable, _ChatLock] = {}
+
+    @staticmethod
+    def get_chat_key(update: object) -> Optional[Hashable]:
+        """Return the chat the update belongs to, if any."""
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(
+        self,
+        update: object,
+        coroutine: Awaitable[Any]
+    ) -> None:
+        chat_key = self.get_chat_key(update)
+        if chat_key is None:
+            async with self._handling_semaphore:
+                await coroutine
+            return
+
+        chat_lock = self._chat_locks.get(chat_key)
+        if chat_lock is None:
+            chat_lock = self._chat_locks[chat_key] = _ChatLock()
+        chat_lock.users += 1
+        try:
+            async with chat_lock.lock, self._handling_semaphore:
+                await coroutine
+        finally:
+            chat_lock.users -= 1
+            if not chat_lock.users:
+                del self._chat_locks[chat_key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class UpdateQueue(asyncio.Queue):
+    """Update queue which holds back the application once
+    ``max_taken_updates`` updates are taken and not done yet.
+
+    The application takes an update with :meth:`get` and starts handling
+    it right away when updates are processed concurrently, so the
+    updates would pile up in the update processor instead of the queue.
+    :meth:`get` waits while ``max_taken_updates`` taken updates are not
+    marked with :meth:`task_done`, so the queue fills up and the updates
+    are not fetched from Telegram until the handlers catch up.
+    """
+    def __init__(self, maxsize: int, max_taken_updates: int):
+        super().__init__(maxsize)
+        self.max_taken_updates = max_taken_updates
+        self._taken_updates = 0
+        self._taking_semaphore = asyncio.Semaphore(max_taken_updates)
+
+    async def get(self) -> Any:
+        await self._taking_semaphore.acquire()
+        try:
+            update = await super().get()
+        except BaseException:
+            self._taking_semaphore.release()
+            raise
+        self._taken_updates += 1
+        return update
+
+    def task_done(self) -> None:
+        super().task_done()
+        # The application also marks the updates dropped on stop as done
+        # without taking them.
+        if self._taken_updates:
+            self._taken_updates -= 1
+            self._taking_semaphore.release()
+
+
+class _ChatLock():
+    """Lock of a chat along with the count of updates holding or waiting
+    for it, so that the lock is dropped after the last one.
+    """
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
@@ -0,0 +1,170 @@
+import hmac
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, MutableMapping
+from urllib.parse import urlparse
+
+from django.conf import settings
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+Scope = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+class TelegramWebhook():
+    """Receive the bot updates in the ASGI application of the site.
+
+    Telegram posts the updates to the webhook path, the rest of requests
+    are passed to the site. An update is only put into the bounded update
+    queue of the bot application, so a burst of updates waits for the
+    handlers there, and the sender is held back once the queue is full.
+    Requests without the secret token are rejected, and so are requests
+    larger than ``max_body_size`` before they are read.
+    The bot application is started and stopped with the ASGI lifespan.
+    """
+    def __init__(
+        self,
+        site: ASGIApp,
+        bot_application: Application,
+        path: str,
+        webhook_url: str,
+        secret_token: str,
+        max_connections: int = 40,
+        max_body_size: int = 1024 * 1024
+    ):
+        self.site = site
+        self.bot_application = bot_application
+        self.path = path
+        self.webhook_url = webhook_url
+        self.secret_token = secret_token
+        self.max_connections = max_connections
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] == 'lifespan':
+            await self.handle_lifespan(receive, send)
+            return
+
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            await self.handle_update(scope, receive, send)
+            return
+
+        await self.site(scope, receive, send)
+
+    async def handle_lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.start_bot()
+                except Exception as error:
+                    logger.exception('Failed to start the bot')
+                    await send({
+                        'type': 'lifespan.startup.failed',
+                        'message': str(error)
+                    })
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.stop_bot()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def start_bot(self) -> None:
+        await self.bot_application.initialize()
+        if self.bot_application.post_init:
+            await self.bot_application.post_init(self.bot_application)
+        await self.bot_application.start()
+        await self.bot_application.bot.set_webhook(
+            url=self.webhook_url,
+            secret_token=self.secret_token,
+            max_connections=self.max_connections,
+            allowed_updates=Update.ALL_TYPES
+        )
+
+    async def stop_bot(self) -> None:
+        if self.bot_application.running:
+            await self.bot_application.stop()
+            if self.bot_application.post_stop:
+                await self.bot_application.post_stop(self.bot_application)
+        await self.bot_application.shutdown()
+        if self.bot_application.post_shutdown:
+            await self.bot_application.post_shutdown(self.bot_application)
+
+    async def handle_update(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send
+    ) -> None:
+        if scope['method'] != 'POST':
+            await self.respond(send, 405)
+            return
+
+        headers = dict(scope['headers'])
+        secret_token = headers.get(b'x-telegram-bot-api-secret-token', b'')
+        if not hmac.compare_digest(secret_token, self.secret_token.encode()):
+            await self.respond(send, 403)
+            return
+
+        try:
+            content_length = int(headers.get(b'content-length', 0))
+        except ValueError:
+            await self.respond(send, 400)
+            return
+        if content_length > self.max_body_size:
+            await self.respond(send, 413)
+            return
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > self.max_body_size:
+                await self.respond(send, 413)
+                return
+            more_body = message.get('more_body', False)
+
+        try:
+            update = Update.de_json(json.loads(body), self.bot_application.bot)
+        except (ValueError, TypeError, KeyError):
+            logger.warning('Rejected malformed update')
+            await self.respond(send, 400)
+            return
+
+        if update:
+            await self.bot_application.update_queue.put(update)
+        await self.respond(send, 200)
+
+    @staticmethod
+    async def respond(send: Send, status: int) -> None:
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-length', b'0')]
+        })
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+def wrap_site(site: ASGIApp) -> ASGIApp:
+    """Mount the bot webhook in the site if it is configured."""
+    if not settings.TELEGRAM_WEBHOOK_ASGI or not settings.TELEGRAM_WEBHOOK_URL:
+        return site
+
+    from run_bot import build_application
+
+    return TelegramWebhook(
+        site,
+        build_application(),
+        urlparse(settings.TELEGRAM_WEBHOOK_URL).path or '/',
+        settings.TELEGRAM_WEBHOOK_URL,
+        secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+        max_connections=settings.TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+        max_body_size=settings.TELEGRAM_WEBHOOK_MAX_BODY_SIZE
+    )
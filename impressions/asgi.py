@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'impressions.settings')
 
 application = get_asgi_application()
+
+from bot.webhook import wrap_site  # noqa: E402
+
+application = wrap_site(application)
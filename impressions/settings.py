@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from environs import Env
 
 
@@ -88,6 +89,26 @@ DATABASES = {
     }
 }
 
+# The production profile lets the bot and the admin write concurrently:
+# readers do not block the writer in WAL mode, a writer waits for another
+# one for SQLITE_BUSY_TIMEOUT seconds, connections are kept open.
+DATABASE_PROFILE = env.str('DATABASE_PROFILE', 'default')
+SQLITE_PRAGMAS = {}
+if DATABASE_PROFILE == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = env.int(
+        'DATABASE_CONN_MAX_AGE',
+        None
+    )
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': env.float('SQLITE_BUSY_TIMEOUT', 20),
+    }
+    SQLITE_PRAGMAS = {
+        'journal_mode': env.str('SQLITE_JOURNAL_MODE', 'wal'),
+        'synchronous': env.str('SQLITE_SYNCHRONOUS', 'normal'),
+        'mmap_size': env.int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        'cache_size': env.int('SQLITE_CACHE_SIZE', -64000),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,3 +157,66 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Telegram bot
 TELEGRAM_BOT_TOKEN = env.str('TELEGRAM_BOT_TOKEN')
+TELEGRAM_UPDATE_QUEUE_SIZE = env.int('TELEGRAM_UPDATE_QUEUE_SIZE', 1000)
+TELEGRAM_CONCURRENT_UPDATES = env.int('TELEGRAM_CONCURRENT_UPDATES', 16)
+TELEGRAM_WEBHOOK_URL = env.str('TELEGRAM_WEBHOOK_URL', '')
+TELEGRAM_WEBHOOK_LISTEN = env.str('TELEGRAM_WEBHOOK_LISTEN', '127.0.0.1')
+TELEGRAM_WEBHOOK_PORT = env.int('TELEGRAM_WEBHOOK_PORT', 8443)
+TELEGRAM_WEBHOOK_SECRET = env.str('TELEGRAM_WEBHOOK_SECRET', '')
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = env.int(
+    'TELEGRAM_WEBHOOK_MAX_CONNECTIONS',
+    40
+)
+TELEGRAM_WEBHOOK_MAX_BODY_SIZE = env.int(
+    'TELEGRAM_WEBHOOK_MAX_BODY_SIZE',
+    1024 * 1024
+)
+TELEGRAM_WEBHOOK_ASGI = env.bool('TELEGRAM_WEBHOOK_ASGI', False)
+if TELEGRAM_WEBHOOK_URL and not TELEGRAM_WEBHOOK_SECRET:
+    raise ImproperlyConfigured(
+        'TELEGRAM_WEBHOOK_SECRET is required with TELEGRAM_WEBHOOK_URL'
+    )
+BOT_LANGUAGES = env.list('BOT_LANGUAGES', ['russian', 'english'])
+BOT_DEFAULT_LANGUAGE = env.str('BOT_DEFAULT_LANGUAGE', 'english')
+
+# Chat data persistence
+CHAT_DATA_WRITE_INTERVAL = env.float('CHAT_DATA_WRITE_INTERVAL', 5)
+CHAT_DATA_WRITE_BATCH_SIZE = env.int('CHAT_DATA_WRITE_BATCH_SIZE', 500)
+CHAT_DATA_CACHE_SIZE = env.int('CHAT_DATA_CACHE_SIZE', 10000)
+CHAT_DATA_JOURNAL_PATH = env.str('CHAT_DATA_JOURNAL_PATH', '')
+CHAT_DATA_JOURNAL_COMPACT_EVERY = env.int(
+    'CHAT_DATA_JOURNAL_COMPACT_EVERY',
+    10000
+)
+
+# Archive of idle chats
+CHAT_ARCHIVE_IDLE_DAYS = env.int('CHAT_ARCHIVE_IDLE_DAYS', 180)
+CHAT_ARCHIVE_BATCH_SIZE = env.int('CHAT_ARCHIVE_BATCH_SIZE', 500)
+CHAT_ARCHIVE_INTERVAL = env.int('CHAT_ARCHIVE_INTERVAL', 24 * 60 * 60)
+CHAT_ARCHIVE_PAUSE = env.float('CHAT_ARCHIVE_PAUSE', 0.1)
+
+# Catalog cache
+CATALOG_VERSION_FILE = env.str(
+    'CATALOG_VERSION_FILE',
+    str(BASE_DIR / 'catalog.version')
+)
+CATALOG_CHECK_INTERVAL = env.float('CATALOG_CHECK_INTERVAL', 5)
+CERTIFICATES_VERSION_FILE = env.str(
+    'CERTIFICATES_VERSION_FILE',
+    str(BASE_DIR / 'certificates.version')
+)
+
+# Certificate issuance
+CERTIFICATE_ISSUE_BATCH_SIZE = env.int('CERTIFICATE_ISSUE_BATCH_SIZE', 1000)
+
+# Database calls
+DATABASE_THREADS = env.int('DATABASE_THREADS', 0)
+DATABASE_ASYNC = env.bool('DATABASE_ASYNC', False)
+
+# Outbox of support applications
+SUPPORT_APPLICATION_OUTBOX_PATH = env.str(
+    'SUPPORT_APPLICATION_OUTBOX_PATH',
+    str(BASE_DIR / 'support_applications.jsonl')
+)
+SUPPORT_APPLICATION_INTERVAL = env.float('SUPPORT_APPLICATION_INTERVAL', 2)
+SUPPORT_APPLICATION_BATCH_SIZE = env.int('SUPPORT_APPLICATION_BATCH_SIZE', 500)
@@ -1,14 +1,19 @@
 # coding=utf-8
 """Organize the work of the impressions telegram bot."""
+import asyncio
 import io
 import logging
 import os
 import re
-from typing import Dict
+from enum import IntEnum
+from typing import Dict, Sequence, Tuple
+from urllib.parse import urlparse
 
+import django
 import phonenumbers
-from dotenv import load_dotenv
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from telegram import InlineKeyboardMarkup, Update
 from telegram.ext import (
     Application,
     CallbackQueryHandler,
@@ -18,7 +23,34 @@ from telegram.ext import (
     MessageHandler
 )
 
-
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'impressions.settings')
+django.setup()
+
+from bot.archive import archive_chat_batch, get_archive_cutoff  # noqa: E402
+from bot.conversation import StateMachine  # noqa: E402
+from bot.database import AsyncDatabase, Database  # noqa: E402
+from bot.keyboards import KeyboardRegistry, make_keyboard  # noqa: E402
+from bot.messages import (  # noqa: E402
+    escape_markdown,
+    load_message_catalogs,
+    MessageCatalog
+)
+from bot.outbox import support_application_outbox  # noqa: E402
+from bot.persistence import ChatSession, DjangoPersistence  # noqa: E402
+from bot.updates import ChatUpdateProcessor, UpdateQueue  # noqa: E402
+
+
+State = IntEnum(
+    'State',
+    'START SELECTING_LANGUAGE MAIN_MENU SELECTING_IMPRESSION '
+    'SELECTING_RECEIVING_METHOD WAITING_CUSTOMER_EMAIL '
+    'ACQUAINTED_PRIVACY_POLICY WAITING_CUSTOMER_FULLNAME '
+    'WAITING_CUSTOMER_PHONE WAITING_PAYMENT_SCREENSHOT DIALOGUE_END '
+    'SELECTING_DELIVERY_METHOD WAITING_RECIPIENT_FULLNAME '
+    'WAITING_RECIPIENT_CONTACT CONFIRMING_SELF_DELIVERY '
+    'WAITING_CERTIFICATE_ID WRONG_CERTIFICATE_MENU SELECTING_QUESTION '
+    'ANSWER_MENU'
+)
 (START, SELECTING_LANGUAGE, MAIN_MENU, SELECTING_IMPRESSION,
  SELECTING_RECEIVING_METHOD, WAITING_CUSTOMER_EMAIL, ACQUAINTED_PRIVACY_POLICY,
  WAITING_CUSTOMER_FULLNAME, WAITING_CUSTOMER_PHONE,
@@ -26,7 +58,58 @@ from telegram.ext import (
  SELECTING_DELIVERY_METHOD, WAITING_RECIPIENT_FULLNAME,
  WAITING_RECIPIENT_CONTACT, CONFIRMING_SELF_DELIVERY,
  WAITING_CERTIFICATE_ID, WRONG_CERTIFICATE_MENU,
- SELECTING_QUESTION, ANSWER_MENU) = range(1, 20)
+ SELECTING_QUESTION, ANSWER_MENU) = State
+
+database = AsyncDatabase() if settings.DATABASE_ASYNC else Database()
+message_catalogs = load_message_catalogs(settings.BOT_LANGUAGES)
+default_messages = message_catalogs[settings.BOT_DEFAULT_LANGUAGE]
+
+keyboards = KeyboardRegistry(
+    {
+        'main_menu': [
+            [
+                ('impressions_button', 'impression'),
+                ('certificate_button', 'certificate')
+            ],
+            [('faq_button', 'faq')]
+        ],
+        'receiving_methods_menu': [
+            [('email_button', 'email'), ('gift_box_button', 'gift_box')],
+            [('other_impression_button', 'impression')],
+            [('back_to_main_menu_button', 'main_menu')]
+        ],
+        'privacy_policy': [[('privacy_policy_button', 'privacy_policy')]],
+        'purchase_thanks': [[('purchase_thanks_button', 'dialogue_end')]],
+        'delivery_methods_menu': [[
+            ('courier_delivery_button', 'courier_delivery'),
+            ('self_delivery_button', 'self_delivery')
+        ]],
+        'self_delivery_menu': [[
+            ('self_delivery_yes_button', 'self_delivery_yes'),
+            ('self_delivery_no_button', 'self_delivery_no')
+        ]],
+        'wrong_certificate_menu': [[
+            ('certificate_id_again_button', 'certificate_id'),
+            ('call_person_button', 'call_person')
+        ]],
+        'answer_menu': [
+            [('back_to_questions_button', 'questions_list')],
+            [('back_to_main_menu_button', 'main_menu')]
+        ]
+    },
+    message_catalogs
+)
+language_menu_text = ' / '.join(
+    messages['select_language']
+    for messages in message_catalogs.values()
+)
+language_keyboard = make_keyboard([[
+    (messages['language_button'], language)
+    for language, messages in message_catalogs.items()
+]])
+
+MenuRender = Tuple[Sequence[Dict], str, InlineKeyboardMarkup]
+menu_renders: Dict[Tuple[str, str], MenuRender] = {}
 
 
 async def handle_users_reply(
@@ -42,34 +125,12 @@ async def handle_users_reply(
         if update.message
         else update.callback_query.data
     )
-    states_functions = {
-        START: handle_start_command,
-        SELECTING_LANGUAGE: handle_language_menu,
-        MAIN_MENU: handle_main_menu,
-        SELECTING_IMPRESSION: handle_impressions_menu,
-        SELECTING_RECEIVING_METHOD: handle_receiving_methods_menu,
-        WAITING_CUSTOMER_EMAIL: handle_customer_email_message,
-        ACQUAINTED_PRIVACY_POLICY: handle_privacy_policy_button,
-        WAITING_CUSTOMER_FULLNAME: handle_customer_fullname_message,
-        WAITING_CUSTOMER_PHONE: handle_customer_phone_message,
-        WAITING_PAYMENT_SCREENSHOT: handle_payment_screenshot,
-        DIALOGUE_END: handle_dialogue_end,
-        SELECTING_DELIVERY_METHOD: handle_delivery_methods_menu,
-        WAITING_RECIPIENT_FULLNAME: handle_recipient_fullname_message,
-        WAITING_RECIPIENT_CONTACT: handle_recipient_contact_message,
-        CONFIRMING_SELF_DELIVERY: handle_self_delivery_menu,
-        WAITING_CERTIFICATE_ID: handle_certificate_id_message,
-        WRONG_CERTIFICATE_MENU: handle_wrong_certificate_menu,
-        SELECTING_QUESTION: handle_questions_menu,
-        ANSWER_MENU: handle_answer_menu
-    }
     chat_state = (
         START
         if user_reply == '/start'
         else context.chat_data.get('next_state') or START
     )
-    state_handler = states_functions[int(chat_state)]
-    next_state = await state_handler(update, context)
+    next_state = await conversation.handle(int(chat_state), update, context)
     context.chat_data['next_state'] = next_state
 
 
@@ -78,13 +139,10 @@ async def handle_start_command(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Handle the start command."""
-    text = 'Выбери, пожалуйста, язык / Please, select a language'
-    keyboard = [[
-        InlineKeyboardButton('🇷🇺 Русский', callback_data='russian'),
-        InlineKeyboardButton('🇬🇧 English', callback_data='english')
-    ]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(text=text, reply_markup=reply_markup)
+    await update.message.reply_text(
+        text=language_menu_text,
+        reply_markup=language_keyboard
+    )
     return SELECTING_LANGUAGE
 
 
@@ -111,32 +169,9 @@ async def send_main_menu(
     text: str = ''
 ) -> int:
     """Send Main menu to chat."""
-    if context.chat_data['language'] == 'russian':
-        message = 'Выбери, пожалуйста, что ты хочешь сделать'
-        buttons = [
-            'Выбрать впечатление',
-            'Активировать сертификат',
-            'F.A.Q. и поддержка'
-        ]
-    else:
-        message = 'Please choose what you want to do'
-        buttons = [
-            'Select Impression',
-            'Activate Certificate',
-            'F.A.Q. and Support'
-        ]
-
-    text = f'{text}{message}'
-    keyboard = [
-        [
-            InlineKeyboardButton(buttons[0], callback_data='impression'),
-            InlineKeyboardButton(buttons[1], callback_data='certificate')
-        ],
-        [
-            InlineKeyboardButton(buttons[2], callback_data='faq')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    messages = get_messages(context)
+    text = f"{text}{messages['main_menu']}"
+    reply_markup = keyboards.get('main_menu', messages)
     if update.callback_query:
         await update.callback_query.edit_message_text(
             text=text,
@@ -154,7 +189,7 @@ async def handle_main_menu(
 ) -> int:
     """Handle Main menu."""
     if not update.callback_query:
-        text = get_misunderstanding_message(context.chat_data['language'])
+        text = get_messages(context)['misunderstanding']
         next_state = await send_main_menu(update, context, text)
         return next_state
 
@@ -173,19 +208,12 @@ async def handle_main_menu(
         return next_state
 
 
-def get_misunderstanding_message(language: str) -> str:
-    """Returns a message that the user action is not clear"""
-    if language == 'russian':
-        text = (
-            'Извини, непонятно, что ты хочешь выбрать. '
-            'Попробуй ещё раз.\n\n'
-        )
-    else:
-        text = (
-            "Sorry, it's not clear what you want to choose. "
-            "Try again.\n\n"
-        )
-    return text
+def get_messages(context: ContextTypes.DEFAULT_TYPE) -> MessageCatalog:
+    """Return the messages in the language of the chat."""
+    return message_catalogs.get(
+        context.chat_data.get('language'),
+        default_messages
+    )
 
 
 async def send_impressions_menu(
@@ -194,38 +222,15 @@ async def send_impressions_menu(
     text: str = ''
 ) -> int:
     """Send Impressions menu."""
-    impressions = await Database.get_impressions(context.chat_data['language'])
+    messages = get_messages(context)
+    impressions = await database.get_impressions(context.chat_data['language'])
     if not impressions:
-        if context.chat_data['language'] == 'russian':
-            text = 'Извини, впечатлений пока нет.\n'
-        else:
-            text = 'Sorry, no impressions yet.\n'
+        text = messages['no_impressions']
         next_state = await send_main_menu(update, context, text)
         return next_state
 
-    if context.chat_data['language'] == 'russian':
-        text = f'{normalise_text(text)}Выбери впечатление:\n\n'
-        button = '« Вернуться в главное меню'
-    else:
-        text = f'{normalise_text(text)}Choose an impression:\n\n'
-        button = '« Back to main menu'
-
-    keyboard = []
-    buttons_in_row = calculate_buttons_in_row(buttons_count=len(impressions))
-    for impression_index, impression in enumerate(impressions):
-        impression_title = normalise_text(make_impression_title(impression))
-        text += f"[{impression_title}]({impression['url']})\n"
-        if not (impression_index % buttons_in_row):
-            keyboard.append([])
-        keyboard[-1].append(InlineKeyboardButton(
-            f"{impression['number']}",
-            callback_data=f"{impression['id']}")
-        )
-
-    keyboard.append([InlineKeyboardButton(button, callback_data='main_menu')])
-
-    text += '\n'
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    menu_text, reply_markup = render_impressions_menu(impressions, messages)
+    text = f'{escape_markdown(text)}{menu_text}'
     if update.callback_query:
         await update.callback_query.edit_message_text(
             text,
@@ -242,6 +247,42 @@ async def send_impressions_menu(
     return SELECTING_IMPRESSION
 
 
+def render_impressions_menu(
+    impressions: Sequence[Dict],
+    messages: MessageCatalog
+) -> Tuple[str, InlineKeyboardMarkup]:
+    """Render the text and keyboard of Impressions menu.
+
+    The render is cached until the catalog of impressions is reloaded.
+    """
+    cached_render = menu_renders.get(('impressions', messages.language))
+    if cached_render and cached_render[0] is impressions:
+        return cached_render[1:]
+
+    text = messages.markdown('impressions_menu')
+    keyboard = []
+    buttons_in_row = calculate_buttons_in_row(buttons_count=len(impressions))
+    for impression_index, impression in enumerate(impressions):
+        impression_title = escape_markdown(make_impression_title(impression))
+        text += f"[{impression_title}]({impression['url']})\n"
+        if not (impression_index % buttons_in_row):
+            keyboard.append([])
+        keyboard[-1].append(
+            (f"{impression['number']}", f"{impression['id']}")
+        )
+
+    keyboard.append([(messages['back_to_main_menu_button'], 'main_menu')])
+
+    text += '\n'
+    reply_markup = make_keyboard(keyboard)
+    menu_renders[('impressions', messages.language)] = (
+        impressions,
+        text,
+        reply_markup
+    )
+    return text, reply_markup
+
+
 def make_impression_title(impression: Dict) -> str:
     """Make impression title."""
     return (
@@ -251,19 +292,6 @@ def make_impression_title(impression: Dict) -> str:
     )
 
 
-def normalise_text(text: str) -> str:
-    """Normalise text for parsing in Telegram."""
-    escape_chars = r'_[]()~`>#+-=|{}.!'
-    new_text = ''
-    old_character = ''
-    for character in text:
-        if character in escape_chars and old_character != '\\':
-            new_text += '\\'
-        new_text += character
-        old_character = character
-    return new_text
-
-
 def calculate_buttons_in_row(buttons_count: int) -> int:
     """Count how many buttons to place in a row."""
     buttons_in_row = 5
@@ -310,17 +338,7 @@ async def handle_unrecognized_impression(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Handle unrecognized_impression."""
-    if context.chat_data['language'] == 'russian':
-        text = (
-            'Извини, непонятно, какое впечатление ты хочешь '
-            'выбрать. Попробуй ещё раз.\n\n'
-        )
-    else:
-        text = (
-            "Sorry, it's not clear which impression you want to "
-            "choose. Try again.\n\n"
-        )
-
+    text = get_messages(context)['unrecognized_impression']
     next_state = await send_impressions_menu(update, context, text)
     return next_state
 
@@ -331,51 +349,16 @@ async def send_receiving_methods_menu(
     text: str = ''
 ) -> int:
     """Send to chat Menu of ways to receive order."""
-    impression = await Database.get_impression(
+    messages = get_messages(context)
+    impression = await database.get_impression(
         context.chat_data['impression_id'],
         context.chat_data['language']
     )
-    impression_title = make_impression_title(impression)
-    if context.chat_data['language'] == 'russian':
-        text = normalise_text(
-            f'{text}Отличный выбор! Ты выбрал(а) ' +
-            'сертификат:\n*' +
-            impression_title +
-            '*\n\nВ какой форме хочешь получить его?'
-        )
-        buttons = [
-            '📧 По электронной почте',
-            '📨 В подарочной коробке',
-            '‹ Выбрать другое впечатление',
-            '« Вернуться в главное меню'
-        ]
-    else:
-        text = normalise_text(
-            f'{text}Great choice! You chose ' +
-            'the certificate:\n*' +
-            impression_title +
-            '*\n\nIn what form do you want to receive it?'
-        )
-        buttons = [
-            '📧 By email',
-            '📨 In a gift box',
-            '‹ Choose a different impression',
-            '« Back to main menu'
-        ]
-
-    keyboard = [
-        [
-            InlineKeyboardButton(buttons[0], callback_data='email'),
-            InlineKeyboardButton(buttons[1], callback_data='gift_box'),
-        ],
-        [
-            InlineKeyboardButton(buttons[2], callback_data='impression')
-        ],
-        [
-            InlineKeyboardButton(buttons[3], callback_data='main_menu')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    text = escape_markdown(text) + messages.markdown(
+        'receiving_methods_menu',
+        impression_title=make_impression_title(impression)
+    )
+    reply_markup = keyboards.get('receiving_methods_menu', messages)
     if update.callback_query:
         await update.callback_query.edit_message_text(
             text=text,
@@ -398,17 +381,7 @@ async def handle_receiving_methods_menu(
 ) -> int:
     """Handle Receipt method selecting."""
     if not update.callback_query:
-        if context.chat_data['language'] == 'russian':
-            text = (
-                'Извини, непонятно, какой способ получения сертификата ты '
-                'хочешь выбрать. Попробуй ещё раз.\n\n'
-            )
-        else:
-            text = (
-                "Sorry, it's not clear which method of receiving "
-                'your certificate you want to choose. '
-                'Try again.\n\n'
-            )
+        text = get_messages(context)['unrecognized_receiving_method']
         next_state = await send_receiving_methods_menu(update, context, text)
         return next_state
 
@@ -437,13 +410,7 @@ async def handle_email_button(
 ) -> int:
     """Handle Email button click."""
     context.chat_data['receiving_method'] = 'email'
-    if context.chat_data['language'] == 'russian':
-        text = 'Напиши почту, на которую хотел(а) бы получить сертификат:'
-    else:
-        text = (
-            'Write the email to which you would like to receive '
-            'the certificate:'
-        )
+    text = get_messages(context)['email_request']
     await update.callback_query.edit_message_text(text=text)
     return WAITING_CUSTOMER_EMAIL
 
@@ -456,14 +423,7 @@ async def handle_customer_email_message(
     pattern = r'(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)'
     match = re.match(pattern, update.message.text.strip())
     if not match:
-        if context.chat_data['language'] == 'russian':
-            text = (
-                'Ошибка в написании электронной почты.\n'
-                'Пожалуйста, пришли нам свой адрес электронной почты:'
-            )
-        else:
-            text = 'Email spelling error.\nPlease send us your email:'
-
+        text = get_messages(context)['email_error']
         await update.message.reply_text(text=text)
         return WAITING_CUSTOMER_EMAIL
 
@@ -487,24 +447,10 @@ async def send_privacy_policy(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Send Privacy Policy to chat."""
-    policy_url = await Database.get_policy_url(context.chat_data['language'])
-    if context.chat_data['language'] == 'russian':
-        text = (
-            'Спасибо, записали 👌\n\n'
-            'Пожалуйста, ознакомься с *[Политикой конфиденциальности и '
-            f'положением об обработке персональных данных 📇]({policy_url})*'
-        )
-        button = 'Ознакомлен(а)'
-    else:
-        text = (
-            'Thank you, we wrote it down 👌\n\n'
-            'Please read the *[Privacy Policy and the provisions '
-            f'on the processing of personal data 📇]({policy_url})*'
-        )
-        button = 'Acquainted'
-
-    keyboard = [[InlineKeyboardButton(button, callback_data='privacy_policy')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    messages = get_messages(context)
+    policy_url = await database.get_policy_url(context.chat_data['language'])
+    text = messages.text('privacy_policy', policy_url=policy_url)
+    reply_markup = keyboards.get('privacy_policy', messages)
 
     if update.callback_query:
         await update.callback_query.edit_message_text(
@@ -531,10 +477,7 @@ async def handle_privacy_policy_button(
         next_state = await send_privacy_policy(update, context)
         return next_state
 
-    if context.chat_data['language'] == 'russian':
-        text = 'Введи, пожалуйста, свои фамилию и имя (кириллицей):'
-    else:
-        text = 'Please write your first and last name:'
+    text = get_messages(context)['fullname_request']
     await update.callback_query.edit_message_text(text=text)
     return WAITING_CUSTOMER_FULLNAME
 
@@ -559,17 +502,7 @@ async def send_fullname_error_message(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Send to chat Message about an error in the fullname."""
-    if context.chat_data['language'] == 'russian':
-        text = (
-            'Ошибка в написании фамилии и имени.\n'
-            'Пожалуйста, пришли нам фамилию и имя (кириллицей):'
-        )
-    else:
-        text = (
-            'First and last name spelling error.\n'
-            'Please send us the first and last name:'
-        )
-
+    text = get_messages(context)['fullname_error']
     await update.message.reply_text(text=text)
     return WAITING_CUSTOMER_FULLNAME
 
@@ -579,11 +512,7 @@ async def send_phone_number_request(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Send to the chat Request to enter the customer phone number."""
-    if context.chat_data['language'] == 'russian':
-        text = 'Оставь, пожалуйста, свой контактный номер телефона:'
-    else:
-        text = 'Please write your contact phone number:'
-
+    text = get_messages(context)['phone_request']
     await update.message.reply_text(text=text)
     return WAITING_CUSTOMER_PHONE
 
@@ -608,17 +537,7 @@ async def handle_customer_phone_message(
             error = not phonenumbers.is_valid_number(value)
 
     if error:
-        if context.chat_data['language'] == 'russian':
-            text = (
-                'Введён некорректный номер телефона.\n'
-                'Пожалуйста, пришли нам свой номер телефона:'
-            )
-        else:
-            text = (
-                'Phone number spelling error.\n'
-                'Please send us your phone number:'
-            )
-
+        text = get_messages(context)['phone_error']
         await update.message.reply_text(text=text)
         return WAITING_CUSTOMER_PHONE
 
@@ -639,24 +558,13 @@ async def send_payment_details(
     text: str = ''
 ) -> int:
     """Send Payment details and wait for payment screenshot."""
-    payment_details = await Database.get_payment_details(
+    payment_details = await database.get_payment_details(
         context.chat_data['language']
     )
-    payment_details = normalise_text(payment_details)
-    if context.chat_data['language'] == 'russian':
-        text = normalise_text(
-            f'{text}Оплатить покупку можно по указанным реквизитам:\n\n*' +
-            payment_details +
-            '\n\n*После оплаты отправь нам скриншот с подтверждением оплаты:'
-        )
-    else:
-        text = normalise_text(
-            f"{text}"
-            "You can pay for the purchase by the specified details:\n\n*" +
-            payment_details +
-            "\n\n*After payment, send us a screenshot with payment:"
-            "confirmation"
-        )
+    text = escape_markdown(text) + get_messages(context).markdown(
+        'payment_details',
+        payment_details=payment_details
+    )
     await update.message.reply_text(text=text, parse_mode='MarkdownV2')
     return WAITING_PAYMENT_SCREENSHOT
 
@@ -666,15 +574,11 @@ async def handle_payment_screenshot(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Handle receipt of screenshot of payment."""
+    messages = get_messages(context)
     if not update.message.photo:
-        if context.chat_data['language'] == 'russian':
-            text = 'Ты прислал не скриншот оплаты.\n\n'
-        else:
-            text = (
-                "You didn't send a screenshot "
-                "of the payment\n\n"
-            )
+        text = messages['not_screenshot']
         await send_payment_details(update, context, text)
+        return WAITING_PAYMENT_SCREENSHOT
 
     file_id = update.message.photo[-1].file_id
     screenshot_file = await context.bot.get_file(file_id)
@@ -682,7 +586,7 @@ async def handle_payment_screenshot(
     await screenshot_file.download_to_memory(out=screenshot_stream)
     screenshot_stream.seek(0)
 
-    await Database.create_order(
+    await database.create_order(
         chat_id=update.effective_chat['id'],
         tg_username=update.effective_chat['username'],
         language=context.chat_data['language'],
@@ -696,21 +600,8 @@ async def handle_payment_screenshot(
         screenshot_stream=screenshot_stream
     )
 
-    if context.chat_data['language'] == 'russian':
-        text = (
-            'Спасибо за покупку! Мы всё проверим '
-            'и в ближайшее время тебе напишет оператор 🎆'
-        )
-        button = 'Спасибо 👌'
-    else:
-        text = (
-            'Thank you for your purchase! We will check everything '
-            'and an operator will write to you shortly 🎆'
-        )
-        button = 'Thanks 👌'
-
-    keyboard = [[InlineKeyboardButton(button, callback_data='dialogue_end')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    text = messages['purchase_thanks']
+    reply_markup = keyboards.get('purchase_thanks', messages)
     await update.message.reply_text(text=text, reply_markup=reply_markup)
     return DIALOGUE_END
 
@@ -731,30 +622,9 @@ async def send_delivery_methods_menu(
     text: str = ''
 ) -> int:
     """Send Delivery methods menu."""
-    if context.chat_data['language'] == 'russian':
-        text = (
-            f'{text}Спасибо!\n'
-            'Подскажи, как тебе удобнее получить сертификат\n\n'
-            'Пункт самовывоза находится на Буките\n\n'
-            'Стоимость доставки зависит от района'
-        )
-        buttons = ['Доставка курьером', 'Самовывоз']
-    else:
-        text = (
-            f'{text}Thank you!\n'
-            'Tell me how you can get the certificate\n\n'
-            'The self-delivery point is on Bukit.\n\n'
-            'Delivery cost depends on the neighbourhood'
-        )
-        buttons = ['Courier delivery', 'Self-delivery']
-
-    keyboard = [
-        [
-            InlineKeyboardButton(buttons[0], callback_data='courier_delivery'),
-            InlineKeyboardButton(buttons[1], callback_data='self_delivery'),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    messages = get_messages(context)
+    text = f"{text}{messages['delivery_methods_menu']}"
+    reply_markup = keyboards.get('delivery_methods_menu', messages)
     if update.callback_query:
         await update.callback_query.edit_message_text(
             text=text,
@@ -772,16 +642,7 @@ async def handle_delivery_methods_menu(
 ) -> int:
     """Handle Delivery method menu."""
     if not update.callback_query:
-        if context.chat_data['language'] == 'russian':
-            text = (
-                'Извини, непонятно, какой способ доставки ты хочешь выбрать. '
-                'Попробуй ещё раз.\n\n'
-            )
-        else:
-            text = (
-                "Sorry, it's not clear which delivery method you want "
-                "to choose. Try again.\n\n"
-            )
+        text = get_messages(context)['unrecognized_delivery_method']
         next_state = await send_delivery_methods_menu(update, context, text)
         return next_state
 
@@ -802,10 +663,7 @@ async def handle_courier_delivery_button(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Handle Courier delivery button click."""
-    if context.chat_data['language'] == 'russian':
-        text = 'Введи имя получателя (кириллицей):'
-    else:
-        text = 'Please write the recipient name:'
+    text = get_messages(context)['recipient_fullname_request']
     await update.callback_query.edit_message_text(text=text)
     return WAITING_RECIPIENT_FULLNAME
 
@@ -830,16 +688,7 @@ async def send_recipient_contact_request(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Send to chat Request recipient's contact."""
-    if context.chat_data['language'] == 'russian':
-        text = (
-            'Как нам связаться с получателем?\n\n'
-            'Напиши номер в WhatsApp или ник в Telegram:'
-        )
-    else:
-        text = (
-            'How do we contact the recipient?\n\n'
-            'Write the number in WhatsApp or nickname in Telegram:'
-        )
+    text = get_messages(context)['recipient_contact_request']
     await update.message.reply_text(text=text)
     return WAITING_RECIPIENT_CONTACT
 
@@ -851,16 +700,7 @@ async def handle_recipient_contact_message(
     """Handle the WAITING_RECIPIENT_CONTACT state."""
     recipient_contact = update.message.text.strip()
     if len(recipient_contact) < 3:
-        if context.chat_data['language'] == 'russian':
-            text = (
-                'Ошибка в присланных контактах.\nПожалуйста, '
-                'пришли нам номер в WhatsApp или ник в Telegram:'
-                )
-        else:
-            text = (
-                'Error in spelling of contacts.\nPlease '
-                'send us the number in WhatsApp or nickname in Telegram:'
-            )
+        text = get_messages(context)['recipient_contact_error']
         await update.message.reply_text(text=text)
         return WAITING_RECIPIENT_CONTACT
 
@@ -881,7 +721,7 @@ async def send_successful_booking_message(
         recipient_fullname = context.chat_data['customer_fullname']
         recipient_contact = 'Получателем является заказчик'
 
-    await Database.create_order(
+    await database.create_order(
         chat_id=update.effective_chat['id'],
         tg_username=update.effective_chat['username'],
         language=context.chat_data['language'],
@@ -895,17 +735,7 @@ async def send_successful_booking_message(
         delivery_method=context.chat_data['delivery_method']
     )
 
-    if context.chat_data['language'] == 'russian':
-        text = (
-            'Мы забронировали сертификат ✨\n\n'
-            'В ближайшее время тебе напишет оператор'
-        )
-    else:
-        text = (
-            "We've booked the certificate ✨\n\n"
-            "An operator will write to you shortly"
-        )
-
+    text = get_messages(context)['booking_done']
     if update.callback_query:
         await update.callback_query.edit_message_text(text=text)
         return DIALOGUE_END
@@ -920,31 +750,16 @@ async def send_self_delivery_menu(
     text: str = ''
 ) -> int:
     """Handle Self-delivery button click."""
-    self_delivery_point = await Database.get_self_delivery_point(
+    self_delivery_point = await database.get_self_delivery_point(
         context.chat_data['language']
     )
-    if context.chat_data['language'] == 'russian':
-        text = (
-            f'{text}Самовывоз доступен по адресу:\n' +
-            self_delivery_point['address'] +
-            '\n\nЧасы работы:\n' +
-            self_delivery_point['opening_hours']
-        )
-        buttons = ['Мне подходит', '‹ Назад к способам доставки']
-    else:
-        text = (
-            f'{text}Self-collection is available at the address:\n' +
-            self_delivery_point['address'] +
-            '\n\nOpening hours:\n' +
-            self_delivery_point['opening_hours']
-        )
-        buttons = ['It works for me', '‹ Back to delivery methods']
-
-    keyboard = [[
-        InlineKeyboardButton(buttons[0], callback_data='self_delivery_yes'),
-        InlineKeyboardButton(buttons[1], callback_data='self_delivery_no'),
-    ]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    messages = get_messages(context)
+    text = text + messages.text(
+        'self_delivery_menu',
+        address=self_delivery_point['address'],
+        opening_hours=self_delivery_point['opening_hours']
+    )
+    reply_markup = keyboards.get('self_delivery_menu', messages)
     if update.callback_query:
         await update.callback_query.edit_message_text(
             text=text,
@@ -965,7 +780,7 @@ async def handle_self_delivery_menu(
 ) -> int:
     """Handle Confirming self-delivery menu."""
     if not update.callback_query:
-        text = get_misunderstanding_message(context.chat_data['language'])
+        text = get_messages(context)['misunderstanding']
         next_state = await send_self_delivery_menu(update, context, text)
         return next_state
 
@@ -985,17 +800,7 @@ async def handle_certificate_button(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Handle Activate certificate button click."""
-    if context.chat_data['language'] == 'russian':
-        text = (
-            'Поздравляем - близкий человек подарил тебе прекрасные '
-            'впечатления!\nОкунёмся в мир невероятных эмоций?\n\n'
-        )
-    else:
-        text = (
-            "Congratulations - a loved one has given you a wonderful "
-            "experience!\nLet's dive into the world of incredible "
-            "emotions?\n\n"
-        )
+    text = get_messages(context)['certificate_greeting']
     next_state = await send_certificate_id_request(update, context, text)
     return next_state
 
@@ -1006,10 +811,7 @@ async def send_certificate_id_request(
     text: str = ''
 ) -> int:
     """Send certificate ID input request to chat."""
-    if context.chat_data['language'] == 'russian':
-        text = f'{text}Введи ID сертификата, чтобы активировать его:'
-    else:
-        text = f"{text}Write your certificate ID to activate it:"
+    text = f"{text}{get_messages(context)['certificate_id_request']}"
     await update.callback_query.edit_message_text(text=text)
     return WAITING_CERTIFICATE_ID
 
@@ -1020,7 +822,7 @@ async def handle_certificate_id_message(
 ) -> int:
     """Handle the WAITING_CERTIFICATE_ID state."""
     certificate_id = update.message.text.strip()
-    activation_results = await Database.activate_certificate(
+    activation_results = await database.activate_certificate(
         chat_id=update.effective_chat['id'],
         tg_username=update.effective_chat['username'],
         language=context.chat_data['language'],
@@ -1044,25 +846,10 @@ async def send_good_certificate_message(
     impression_name: str
 ) -> int:
     """Send to chat menu for case of correct certificate ID."""
-    if context.chat_data['language'] == 'russian':
-        text = normalise_text(
-            'Твое впечатление это -\n'
-            f'*{impression_name}*\n'
-            'Прекрасный выбор!\n\n'
-            'В течение часа с тобой свяжется оператор\n'
-            'и расскажет все детали.\n'
-            'До скорых встреч ✋'
-        )
-    else:
-        text = normalise_text(
-            'Your impression is\n'
-            f'*{impression_name}*\n'
-            'Excellent choice!\n\n'
-            'An operator will contact you within an hour\n'
-            'with all the details.\n'
-            'See you soon ✋'
-        )
-
+    text = get_messages(context).markdown(
+        'good_certificate',
+        impression_name=impression_name
+    )
     if update.callback_query:
         await update.callback_query.edit_message_text(
             text=text,
@@ -1080,28 +867,10 @@ async def send_wrong_certificate_menu(
     text: str = ''
 ) -> int:
     """Send to chat menu for case of incorrect certificate ID."""
-    if context.chat_data['language'] == 'russian':
-        text_beginning = text if text else 'Что-то пошло не так\n'
-        text = (
-            f'{text_beginning}Проверь, пожалуйста, правильно ли ты ввел(а) '
-            'ID и действителен ли срок действия сертификата\n\n'
-            'Если тебе нужна помощь, нажми кнопку "Позвать человека"'
-        )
-        buttons = ['Ввести ID снова', 'Позвать человека']
-    else:
-        text_beginning = text if text else 'Something went wrong\n'
-        text = (
-            f'{text_beginning}Please check if you have entered the ID '
-            'correctly and if the certificate expiry date is valid\n\n'
-            'If you need help, click the "Call Person" button'
-        )
-        buttons = ['Enter ID again', 'Call Person']
-
-    keyboard = [[
-        InlineKeyboardButton(buttons[0], callback_data='certificate_id'),
-        InlineKeyboardButton(buttons[1], callback_data='call_person')
-    ]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    messages = get_messages(context)
+    text_beginning = text or messages['wrong_certificate_beginning']
+    text = f"{text_beginning}{messages['wrong_certificate']}"
+    reply_markup = keyboards.get('wrong_certificate_menu', messages)
     if update.callback_query:
         await update.callback_query.edit_message_text(
             text=text,
@@ -1119,7 +888,7 @@ async def handle_wrong_certificate_menu(
 ) -> int:
     """Handle Wrong certificate menu."""
     if not update.callback_query:
-        text = get_misunderstanding_message(context.chat_data['language'])
+        text = get_messages(context)['misunderstanding']
         next_state = await send_wrong_certificate_menu(update, context, text)
         return next_state
 
@@ -1140,18 +909,14 @@ async def send_calling_person_message(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Send a chat message when calling a person."""
-    await Database.create_support_application(
+    await database.create_support_application(
         chat_id=update.effective_chat['id'],
         tg_username=update.effective_chat['username'],
         language=context.chat_data['language'],
         request_type=context.chat_data['request_type']
     )
 
-    if context.chat_data['language'] == 'russian':
-        text = 'Спасибо за обращение, поддержка ответит в ближайшее время'
-    else:
-        text = 'Thank you for contacting us, support will respond shortly'
-
+    text = get_messages(context)['support_thanks']
     if update.callback_query:
         await update.callback_query.edit_message_text(text)
         return DIALOGUE_END
@@ -1166,45 +931,15 @@ async def send_questions_menu(
     text: str = ''
 ) -> int:
     """Handle the FAQ button click."""
-    faq_details = await Database.get_faq_details(
+    faq_details = await database.get_faq_details(
         context.chat_data['language']
     )
 
-    keyboard = []
-    buttons_in_row = calculate_buttons_in_row(buttons_count=len(faq_details))
-    for question_index, faq_detail in enumerate(faq_details):
-        text += f"{question_index+1}. {faq_detail['question']}\n"
-        if not (question_index % buttons_in_row):
-            keyboard.append([])
-        keyboard[-1].append(
-            InlineKeyboardButton(
-                f"{question_index+1}",
-                callback_data=f"{faq_detail['id']}"
-            )
-        )
-
-    if context.chat_data['language'] == 'russian':
-        text += (
-            '\nВыбери вопрос и нажми на кнопку с его номером:\n'
-            if faq_details
-            else 'Извини, FAQ пока пусто.\n'
-        )
-        buttons = ['Позвать человека', '« Вернуться в главное меню']
-    else:
-        text += (
-            "\nClick on the button with the question number:\n"
-            if faq_details
-            else 'Sorry, the FAQ is empty for now.\n'
-        )
-        buttons = ['Call Person', '« Back to main menu']
-
-    keyboard.append(
-        [InlineKeyboardButton(buttons[0], callback_data='call_person')]
-    )
-    keyboard.append(
-        [InlineKeyboardButton(buttons[1], callback_data='main_menu')]
+    menu_text, reply_markup = render_questions_menu(
+        faq_details,
+        get_messages(context)
     )
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    text = f'{text}{menu_text}'
 
     if update.callback_query:
         await update.callback_query.edit_message_text(
@@ -1220,23 +955,50 @@ async def send_questions_menu(
     return SELECTING_QUESTION
 
 
+def render_questions_menu(
+    faq_details: Sequence[Dict],
+    messages: MessageCatalog
+) -> Tuple[str, InlineKeyboardMarkup]:
+    """Render the text and keyboard of Questions menu.
+
+    The render is cached until the catalog of questions is reloaded.
+    """
+    cached_render = menu_renders.get(('questions', messages.language))
+    if cached_render and cached_render[0] is faq_details:
+        return cached_render[1:]
+
+    text = ''
+    keyboard = []
+    buttons_in_row = calculate_buttons_in_row(buttons_count=len(faq_details))
+    for question_index, faq_detail in enumerate(faq_details):
+        text += f"{question_index+1}. {faq_detail['question']}\n"
+        if not (question_index % buttons_in_row):
+            keyboard.append([])
+        keyboard[-1].append((f"{question_index+1}", f"{faq_detail['id']}"))
+
+    text += (
+        messages['questions_menu']
+        if faq_details
+        else messages['no_questions']
+    )
+    keyboard.append([(messages['call_person_button'], 'call_person')])
+    keyboard.append([(messages['back_to_main_menu_button'], 'main_menu')])
+    reply_markup = make_keyboard(keyboard)
+    menu_renders[('questions', messages.language)] = (
+        faq_details,
+        text,
+        reply_markup
+    )
+    return text, reply_markup
+
+
 async def handle_questions_menu(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Handle Question selecting."""
     if not update.callback_query:
-        if context.chat_data['language'] == 'russian':
-            text = (
-                'Извини, непонятно, какой вопрос ты хочешь '
-                'выбрать. Попробуй ещё раз.\n\n'
-            )
-        else:
-            text = (
-                "Sorry, it's not clear which question you want to "
-                "choose. Try again.\n\n"
-            )
-
+        text = get_messages(context)['unrecognized_question']
         next_state = await send_questions_menu(update, context, text)
         return next_state
 
@@ -1260,27 +1022,17 @@ async def send_answer_menu(
     context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """Send a chat message when calling a person."""
-    faq_detail = await Database.get_faq_detail(
+    faq_detail = await database.get_faq_detail(
         faq_id=update.callback_query.data,
         language=context.chat_data['language']
     )
-    text = normalise_text(
-        f"*{faq_detail['question']}*\n\n{faq_detail['answer']}"
+    messages = get_messages(context)
+    text = messages.markdown(
+        'answer',
+        question=faq_detail['question'],
+        answer=faq_detail['answer']
     )
-
-    if context.chat_data['language'] == 'russian':
-        buttons = [
-            '‹ Вернуться к списку вопросов',
-            '« Вернуться в главное меню'
-        ]
-    else:
-        buttons = ['‹ Back to list of questions', '« Back to main menu']
-
-    keyboard = [
-        [InlineKeyboardButton(buttons[0], callback_data='questions_list')],
-        [InlineKeyboardButton(buttons[1], callback_data='main_menu')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get('answer_menu', messages)
 
     if update.callback_query:
         await update.callback_query.edit_message_text(
@@ -1304,7 +1056,7 @@ async def handle_answer_menu(
 ) -> int:
     """Handle Answer menu."""
     if not update.callback_query:
-        text = get_misunderstanding_message(context.chat_data['language'])
+        text = get_messages(context)['misunderstanding']
         next_state = await send_answer_menu(update, context, text)
         return next_state
 
@@ -1319,41 +1071,209 @@ async def handle_answer_menu(
         return next_state
 
 
-def main() -> None:
-    """Run the bot."""
-    logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.INFO
-    )
+async def archive_idle_chats(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Move the chats idle for a long time to the archive.
+
+    Every batch is moved in its own call to the database thread, so the
+    bot reads and writes chats between the batches.
+    """
+    cutoff = get_archive_cutoff()
+    batch_size = settings.CHAT_ARCHIVE_BATCH_SIZE
+    while (
+        await sync_to_async(archive_chat_batch)(cutoff, batch_size) ==
+        batch_size
+    ):
+        await asyncio.sleep(settings.CHAT_ARCHIVE_PAUSE)
 
-    load_dotenv()
-    bot_token = os.environ['TELEGRAM_BOT_TOKEN']
+
+async def write_support_applications(
+    context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Insert the queued support applications."""
+    await sync_to_async(support_application_outbox.drain)()
+
+
+async def close_support_application_outbox(application: Application) -> None:
+    """Insert the support applications left in the queue at shutdown."""
+    await sync_to_async(support_application_outbox.drain)()
+    support_application_outbox.close()
+
+
+conversation = StateMachine(
+    State,
+    initial_state=START,
+    transitions={
+        START: (handle_start_command, [SELECTING_LANGUAGE]),
+        SELECTING_LANGUAGE: (
+            handle_language_menu,
+            [SELECTING_LANGUAGE, MAIN_MENU]
+        ),
+        MAIN_MENU: (
+            handle_main_menu,
+            [
+                MAIN_MENU,
+                SELECTING_IMPRESSION,
+                WAITING_CERTIFICATE_ID,
+                SELECTING_QUESTION
+            ]
+        ),
+        SELECTING_IMPRESSION: (
+            handle_impressions_menu,
+            [MAIN_MENU, SELECTING_IMPRESSION, SELECTING_RECEIVING_METHOD]
+        ),
+        SELECTING_RECEIVING_METHOD: (
+            handle_receiving_methods_menu,
+            [
+                MAIN_MENU,
+                SELECTING_IMPRESSION,
+                SELECTING_RECEIVING_METHOD,
+                WAITING_CUSTOMER_EMAIL,
+                ACQUAINTED_PRIVACY_POLICY
+            ]
+        ),
+        WAITING_CUSTOMER_EMAIL: (
+            handle_customer_email_message,
+            [WAITING_CUSTOMER_EMAIL, ACQUAINTED_PRIVACY_POLICY]
+        ),
+        ACQUAINTED_PRIVACY_POLICY: (
+            handle_privacy_policy_button,
+            [ACQUAINTED_PRIVACY_POLICY, WAITING_CUSTOMER_FULLNAME]
+        ),
+        WAITING_CUSTOMER_FULLNAME: (
+            handle_customer_fullname_message,
+            [WAITING_CUSTOMER_FULLNAME, WAITING_CUSTOMER_PHONE]
+        ),
+        WAITING_CUSTOMER_PHONE: (
+            handle_customer_phone_message,
+            [
+                WAITING_CUSTOMER_PHONE,
+                SELECTING_DELIVERY_METHOD,
+                WAITING_PAYMENT_SCREENSHOT
+            ]
+        ),
+        WAITING_PAYMENT_SCREENSHOT: (
+            handle_payment_screenshot,
+            [WAITING_PAYMENT_SCREENSHOT, DIALOGUE_END]
+        ),
+        DIALOGUE_END: (handle_dialogue_end, []),
+        SELECTING_DELIVERY_METHOD: (
+            handle_delivery_methods_menu,
+            [
+                SELECTING_DELIVERY_METHOD,
+                WAITING_RECIPIENT_FULLNAME,
+                CONFIRMING_SELF_DELIVERY
+            ]
+        ),
+        WAITING_RECIPIENT_FULLNAME: (
+            handle_recipient_fullname_message,
+            [WAITING_RECIPIENT_FULLNAME, WAITING_RECIPIENT_CONTACT]
+        ),
+        WAITING_RECIPIENT_CONTACT: (
+            handle_recipient_contact_message,
+            [WAITING_RECIPIENT_CONTACT, DIALOGUE_END]
+        ),
+        CONFIRMING_SELF_DELIVERY: (
+            handle_self_delivery_menu,
+            [SELECTING_DELIVERY_METHOD, CONFIRMING_SELF_DELIVERY, DIALOGUE_END]
+        ),
+        WAITING_CERTIFICATE_ID: (
+            handle_certificate_id_message,
+            [WRONG_CERTIFICATE_MENU, DIALOGUE_END]
+        ),
+        WRONG_CERTIFICATE_MENU: (
+            handle_wrong_certificate_menu,
+            [WAITING_CERTIFICATE_ID, WRONG_CERTIFICATE_MENU, DIALOGUE_END]
+        ),
+        SELECTING_QUESTION: (
+            handle_questions_menu,
+            [MAIN_MENU, SELECTING_QUESTION, ANSWER_MENU, DIALOGUE_END]
+        ),
+        ANSWER_MENU: (
+            handle_answer_menu,
+            [MAIN_MENU, SELECTING_QUESTION, ANSWER_MENU]
+        )
+    }
+)
+
+
+async def log_conversation_stats(application: Application) -> None:
+    """Log how often the states were entered and how long they took."""
+    conversation.log_stats()
+
+
+def build_application() -> Application:
+    """Build the bot application with its persistence, jobs and handlers."""
     persistence = DjangoPersistence()
 
     application = (
         Application.builder()
-        .token(bot_token)
+        .token(settings.TELEGRAM_BOT_TOKEN)
         .read_timeout(50)
         .write_timeout(50)
         .get_updates_read_timeout(50)
+        .update_queue(
+            UpdateQueue(
+                settings.TELEGRAM_UPDATE_QUEUE_SIZE,
+                settings.TELEGRAM_CONCURRENT_UPDATES +
+                settings.TELEGRAM_UPDATE_QUEUE_SIZE
+            )
+        )
+        .concurrent_updates(
+            ChatUpdateProcessor(
+                settings.TELEGRAM_CONCURRENT_UPDATES,
+                settings.TELEGRAM_UPDATE_QUEUE_SIZE
+            )
+        )
         .persistence(persistence)
+        .context_types(ContextTypes(chat_data=ChatSession))
+        .post_stop(log_conversation_stats)
+        .post_shutdown(close_support_application_outbox)
         .build()
     )
+    persistence.set_application(application)
+
+    support_application_outbox.open()
+    application.job_queue.run_repeating(
+        write_support_applications,
+        interval=settings.SUPPORT_APPLICATION_INTERVAL
+    )
+
+    if settings.CHAT_ARCHIVE_INTERVAL:
+        application.job_queue.run_repeating(
+            archive_idle_chats,
+            interval=settings.CHAT_ARCHIVE_INTERVAL,
+            first=60
+        )
 
     application.add_handler(CallbackQueryHandler(handle_users_reply))
     application.add_handler(MessageHandler(filters.TEXT, handle_users_reply))
     application.add_handler(MessageHandler(filters.PHOTO, handle_users_reply))
     application.add_handler(CommandHandler('start', handle_users_reply))
+    return application
 
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
 
+def main() -> None:
+    """Run the bot."""
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
 
-if __name__ == '__main__':
-    import django
+    application = build_application()
+    if settings.TELEGRAM_WEBHOOK_URL:
+        application.run_webhook(
+            listen=settings.TELEGRAM_WEBHOOK_LISTEN,
+            port=settings.TELEGRAM_WEBHOOK_PORT,
+            url_path=urlparse(settings.TELEGRAM_WEBHOOK_URL).path,
+            webhook_url=settings.TELEGRAM_WEBHOOK_URL,
+            secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+            max_connections=settings.TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES
+        )
+        return
+
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
 
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'impressions.settings')
-    django.setup()
 
-    from bot.persistence import DjangoPersistence
-    from bot.database import Database
+if __name__ == '__main__':
     main()